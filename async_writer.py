@@ -0,0 +1,217 @@
+# -*- coding: gbk -*-
+"""̨д̣÷ֻӣ/ļ/д붼ں̨߳"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+
+_name_lock = threading.Lock()
+_last_stamp = None
+_stamp_seq = 0
+
+
+def unique_path(directory, prefix='', ext='.jpg'):
+    """ɲĺʱļͬһ׷ _1_2 ..."""
+    global _last_stamp, _stamp_seq
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
+    with _name_lock:
+        if stamp == _last_stamp:
+            _stamp_seq += 1
+        else:
+            _last_stamp = stamp
+            _stamp_seq = 0
+        seq = _stamp_seq
+
+        while True:
+            name = f"{prefix}{stamp}{ext}" if seq == 0 else f"{prefix}{stamp}_{seq}{ext}"
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                break
+            seq += 1
+        _stamp_seq = seq
+    return path
+
+
+class AsyncWriter:
+    """߳д
+
+    submit() ֻ (·, ) Уд߳ÿȡлѹȫ
+     batch_size д꣬ص on_done(path, ok)
+    ݿ bytes  memoryviewдʱٸơ
+
+    encode_workers > 0 ʱ submit_image()ͼڱ̳߳ѹٽд̶С
+    fsync=True ʱһļȫдͳһ fsyncÿĿ¼Ҳֻ fsync һΣ
+    ÿдһļһδ̡
+    observe_latency(seconds) ÿʱյύ̵ĺʱ
+    submit_call() ɰ׷д֮ķļŽͬһУд߳ﰴύ˳ִС
+    """
+
+    def __init__(self, name='writer', max_queue=64, batch_size=16,
+                 encode_workers=0, fsync=False, observe_latency=None):
+        self.name = name
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.observe_latency = observe_latency
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.failed = 0
+        self._encoding = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+        self._latency_count = 0
+        self._stats_lock = threading.Lock()
+        self._encoder = (ThreadPoolExecutor(max_workers=encode_workers, thread_name_prefix=f"{name}-encode")
+                         if encode_workers > 0 else None)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, path, data, on_done=None, block=True):
+        """һд񣻶ʱ block=True ÷ѹblock=False Ӳ False"""
+        job = (path, data, on_done, time.perf_counter())
+        if block:
+            self.queue.put(job)
+            return True
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            return False
+        return True
+
+    def submit_call(self, fn, block=True):
+        """дִ߳ fn()ʱΪ submit() ͬ"""
+        return self.submit(None, fn, block=block)
+
+    def submit_image(self, path, image, params=(), on_done=None):
+        """ڱ̳߳ﰴչ image д̣أʧܰдʧܻص"""
+        submitted = time.perf_counter()
+        with self._stats_lock:
+            self._encoding += 1
+        self._encoder.submit(self._encode, path, image, list(params), on_done, submitted)
+
+    def pending(self):
+        """δ̵ + д̶У"""
+        return self._encoding + self.queue.qsize()
+
+    def stats(self):
+        """ (ѹ, ƽдӳ, дӳ)ӳͳϴε¼"""
+        with self._stats_lock:
+            count, total, worst = self._latency_count, self._latency_sum, self._latency_max
+            self._latency_count, self._latency_sum, self._latency_max = 0, 0.0, 0.0
+        return self.pending(), (total / count if count else 0.0), worst
+
+    def close(self, wait=True):
+        if self._encoder is not None:
+            self._encoder.shutdown(wait=True)
+        self.queue.put(None)
+        if wait:
+            self._thread.join()
+
+    def _encode(self, path, image, params, on_done, submitted):
+        data = None
+        try:
+            ok, buf = cv2.imencode(os.path.splitext(path)[1], image, params)
+            if ok:
+                data = buf
+        except Exception as e:
+            print(f"[{self.name}] 쳣 {path}: {e}")
+        finally:
+            # ʧҲӣд߳ͳһص
+            self.queue.put((path, data, on_done, submitted))
+            with self._stats_lock:
+                self._encoding -= 1
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+
+            batch = [job]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    job = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stop = True
+                    break
+                batch.append(job)
+
+            self._write_batch(batch)
+            if stop:
+                break
+
+    def _write_batch(self, batch):
+        results = []
+        synced = []
+        for path, data, on_done, submitted in batch:
+            if path is None:
+                try:
+                    data()
+                except Exception as e:
+                    print(f"[{self.name}] 쳣: {e}")
+                continue
+            if data is None:
+                self.failed += 1
+                results.append((path, False, on_done, submitted))
+                continue
+            try:
+                f = open(path, 'wb')
+                try:
+                    f.write(data)
+                    f.flush()
+                except OSError:
+                    f.close()
+                    raise
+                synced.append(f)
+                results.append((path, True, on_done, submitted))
+            except OSError as e:
+                print(f"[{self.name}] дʧ {path}: {e}")
+                self.failed += 1
+                results.append((path, False, on_done, submitted))
+
+        if self.fsync:
+            self._fsync_all(synced)
+        for f in synced:
+            f.close()
+        self.written += len(synced)
+
+        now = time.perf_counter()
+        for path, ok, on_done, submitted in results:
+            latency = now - submitted
+            with self._stats_lock:
+                self._latency_sum += latency
+                self._latency_count += 1
+                self._latency_max = max(self._latency_max, latency)
+            if self.observe_latency is not None:
+                self.observe_latency(latency)
+            if on_done is not None:
+                try:
+                    on_done(path, ok)
+                except Exception as e:
+                    print(f"[{self.name}] ص쳣: {e}")
+
+    def _fsync_all(self, files):
+        dirs = set()
+        for f in files:
+            try:
+                os.fsync(f.fileno())
+            except OSError as e:
+                print(f"[{self.name}] fsync ʧ {f.name}: {e}")
+            dirs.add(os.path.dirname(os.path.abspath(f.name)))
+        if os.name == 'nt':
+            return  # Windows ֶ֧Ŀ¼ fsync
+        for d in dirs:
+            try:
+                fd = os.open(d, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass
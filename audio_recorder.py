@@ -0,0 +1,225 @@
+# -*- coding: gbk -*-
+"""ʵʱ PCM Ƶĺֶ̨¼
+
+ֻ߳ submit() յĲ÷ŽУʱ
+д̰߳Ѳܳ CHUNK_SECONDS Ĵת 16 λд룬 segment_seconds зļ
+
+    seg_00000.wav / seg_00000.flac   ÿһļ
+    index.tsv                        ÿһУļ׸ĵʱ䡢ʼ
+
+ʱ䶨λʱٶڲϵһΣͶʱɵ÷
+mark_discontinuity()ĵһʱ GAP_SECONDS ϣ;ʱԶжΡ
+ֻȽۼƱȽϣͶʱɵĻƯƲᱻɶ
+
+FLAC Ҫװ soundfileδװʱԶ WAVʱң
+
+    rec = AudioRecording('received_data/audio_stream/<¼Ŀ¼>')
+    pcm = rec.read(timestamp, seconds=5)
+"""
+import bisect
+import os
+import queue
+import threading
+import time
+import wave
+
+import numpy as np
+
+try:
+    import soundfile as sf
+except ImportError:
+    sf = None
+
+CHUNK_SECONDS = 2.0  # ôдһ
+QUEUE_PACKETS = 1024  # дгȣ
+WRITE_BUFFER = 1024 * 1024
+INDEX_NAME = 'index.tsv'
+GAP_SECONDS = 0.5  # ĵһʱô룬Ϊһ
+
+
+def to_int16(pcm):
+    return (np.clip(pcm, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+class _WavSegment:
+    def __init__(self, path, rate):
+        self._file = open(path, 'wb', buffering=WRITE_BUFFER)
+        self._wav = wave.open(self._file, 'wb')
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(rate)
+
+    def write(self, pcm):
+        self._wav.writeframes(to_int16(pcm).tobytes())
+
+    def close(self):
+        self._wav.close()
+        self._file.close()
+
+
+class _FlacSegment:
+    def __init__(self, path, rate):
+        self._file = sf.SoundFile(path, 'w', samplerate=rate, channels=1, format='FLAC', subtype='PCM_16')
+
+    def write(self, pcm):
+        self._file.write(to_int16(pcm))
+
+    def close(self):
+        self._file.close()
+
+
+class AudioRecorder:
+    """ float32 ķֶ¼submit() ߳е"""
+
+    def __init__(self, directory, rate, segment_seconds=600, fmt='wav'):
+        if fmt == 'flac' and sf is None:
+            print("[AudioRecorder] δװ soundfile wav")
+            fmt = 'wav'
+        self.directory = directory
+        self.rate = rate
+        self.fmt = fmt
+        self.segment_samples = int(segment_seconds * rate)
+        self.samples = 0
+        self.dropped = 0
+        self.segments = 0
+        self.gaps = 0
+        os.makedirs(directory, exist_ok=True)
+
+        self._queue = queue.Queue(maxsize=QUEUE_PACKETS)
+        self._chunk = np.empty(int(CHUNK_SECONDS * rate), dtype=np.float32)
+        self._filled = 0
+        self._segment = None
+        self._segment_start = 0.0
+        self._segment_written = 0
+        self._last_arrival = None
+        self._last_seconds = 0.0
+        self._break_at = None  # ʱ mark_discontinuity() µʱ䣬д߳̾ݴж
+        self._index = open(os.path.join(directory, INDEX_NAME), 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='audio-recorder', daemon=True)
+        self._thread.start()
+        print(f"[AudioRecorder] ʼ¼ {directory}{fmt}ÿ {segment_seconds} s")
+
+    def submit(self, pcm, timestamp=None):
+        """һƣ÷֮󲻵޸ pcmʱһ"""
+        try:
+            self._queue.put_nowait((time.time() if timestamp is None else timestamp, pcm))
+        except queue.Full:
+            self.dropped += len(pcm)
+
+    def mark_discontinuity(self, timestamp=None):
+        """֮ύĲ֮ǰĲ緢Ͷǰдرգһһ
+
+         submit() һʱΪʱ䣬д߳ڵһڸʱĲǰжΡ
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        try:
+            self._queue.put_nowait((timestamp, None))
+        except queue.Full:
+            self._break_at = timestamp
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        print(f"[AudioRecorder] ¼ƽ{self.segments} Σϵ {self.gaps} "
+              f"{self.samples / self.rate:.1f} s {self.dropped} ")
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            timestamp, pcm = item
+            if pcm is None:
+                self._break_segment()
+                continue
+            if self._break_at is not None and timestamp >= self._break_at:
+                self._break_at = None
+                self._break_segment()
+            elif (self._segment is not None and self._last_arrival is not None
+                  and timestamp - self._last_arrival - self._last_seconds > GAP_SECONDS):
+                self._break_segment()
+            self._last_arrival = timestamp
+            self._last_seconds = len(pcm) / self.rate
+            pos = 0
+            while pos < len(pcm):
+                if self._segment is None:
+                    # ʱ = ʱ + ƫ
+                    self._open_segment(timestamp + pos / self.rate)
+                room = min(len(self._chunk) - self._filled,
+                           self.segment_samples - self._segment_written - self._filled)
+                n = min(room, len(pcm) - pos)
+                self._chunk[self._filled:self._filled + n] = pcm[pos:pos + n]
+                self._filled += n
+                pos += n
+                if self._filled == len(self._chunk) or self._segment_written + self._filled >= self.segment_samples:
+                    self._flush()
+                    if self._segment_written >= self.segment_samples:
+                        self._close_segment()
+        self._flush()
+        self._close_segment()
+        self._index.close()
+
+    def _open_segment(self, start_ts):
+        name = f"seg_{self.segments:05d}.{self.fmt}"
+        path = os.path.join(self.directory, name)
+        self._segment = _FlacSegment(path, self.rate) if self.fmt == 'flac' else _WavSegment(path, self.rate)
+        self._segment_start = start_ts
+        self._segment_written = 0
+        self._index.write(f"{name}\t{start_ts:.6f}\t{self.samples}\n")
+        self._index.flush()
+        self.segments += 1
+
+    def _flush(self):
+        if self._filled and self._segment is not None:
+            try:
+                self._segment.write(self._chunk[:self._filled])
+            except (OSError, RuntimeError) as e:
+                print(f"[AudioRecorder] дʧ: {e}")
+            self._segment_written += self._filled
+            self.samples += self._filled
+        self._filled = 0
+
+    def _break_segment(self):
+        if self._segment is not None:
+            self._flush()
+            self._close_segment()
+            self.gaps += 1
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+
+class AudioRecording:
+    """ȡ AudioRecorder ¼Ŀ¼ʱ䶨λ"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.segments = []  # (ļ, ʼʱ, ʼ)
+        with open(os.path.join(directory, INDEX_NAME), encoding='utf-8') as f:
+            for line in f:
+                name, start_ts, start_sample = line.rstrip('\n').split('\t')
+                self.segments.append((name, float(start_ts), int(start_sample)))
+        self._starts = [s[1] for s in self.segments]
+
+    def locate(self, timestamp):
+        """ (±, )ڵһʱصһοͷ"""
+        i = max(bisect.bisect_right(self._starts, timestamp) - 1, 0)
+        return i, max(timestamp - self._starts[i], 0.0)
+
+    def read(self, timestamp, seconds):
+        """ timestamp ʼ seconds  float32 ֻڶڶΣ"""
+        i, offset = self.locate(timestamp)
+        path = os.path.join(self.directory, self.segments[i][0])
+        if path.endswith('.flac'):
+            if sf is None:
+                raise RuntimeError("ȡ flac Ҫװ soundfile")
+            with sf.SoundFile(path) as f:
+                f.seek(min(int(offset * f.samplerate), f.frames))
+                return f.read(int(seconds * f.samplerate), dtype='float32')
+        with wave.open(path, 'rb') as w:
+            rate = w.getframerate()
+            w.setpos(min(int(offset * rate), w.getnframes()))
+            data = np.frombuffer(w.readframes(int(seconds * rate)), np.int16)
+        return data.astype(np.float32) / 32768.0
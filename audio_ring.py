@@ -0,0 +1,66 @@
+# -*- coding: gbk -*-
+"""õĵ/ float32 λ
+
+߳ write()ص read_into()˸ֻԼλü
+дͶһΣԽβʱΣnumpy Ƭ仺
+"""
+import numpy as np
+
+
+class AudioRing:
+    """ԤĲ
+
+    _write / _read ǵĲʵ±ȡģȿ
+    ǰ _writeȿǰ _read˶Էλɵġ
+    ʱдĲ֣߲ǰ _readɷֵ֪÷
+    """
+
+    def __init__(self, capacity):
+        self._buf = np.zeros(capacity, dtype=np.float32)
+        self._capacity = capacity
+        self._write = 0
+        self._read = 0
+
+    def __len__(self):
+        return self._write - self._read
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def free(self):
+        return self._capacity - (self._write - self._read)
+
+    def write(self, samples):
+        """дһά float32 ʵдĵʱС len(samples)"""
+        n = min(len(samples), self.free())
+        if n <= 0:
+            return 0
+        w = self._write % self._capacity
+        first = min(n, self._capacity - w)
+        self._buf[w:w + first] = samples[:first]
+        if n > first:
+            self._buf[:n - first] = samples[first:n]
+        self._write += n
+        return n
+
+    def read_into(self, out):
+        """ len(out)  outضĵ㲿ֲ out"""
+        n = min(len(out), self._write - self._read)
+        if n <= 0:
+            return 0
+        r = self._read % self._capacity
+        first = min(n, self._capacity - r)
+        out[:first] = self._buf[r:r + first]
+        if n > first:
+            out[first:n] = self._buf[:n - first]
+        self._read += n
+        return n
+
+    def discard(self, n):
+        """ɵ n ֻһ"""
+        self._read += max(0, min(n, self._write - self._read))
+
+    def clear(self):
+        """ȫδݣֻһ"""
+        self._read = self._write
@@ -0,0 +1,220 @@
+# -*- coding: gbk -*-
+"""΢׼tcp_receive_image.parse_messages  tcp_receive_stero.parse_large_messages
+
+úϳն˵Ľѭ仯
+    ֡С        --sizes 16384,131072,1048576
+    ֿ鷽ʽ      4k 4KB recv з֣split-headerÿͷг룻wholeһθ
+    Ϣ  --image-ratioimage ЭдͼռȫϢı
+ÿϵ frames/s ÿֽ֡
+
+ÿֽ֡ tracemalloc ͳƣÿιһǰ reset_peak()
+ۼӸÿ鴦ڼڴֵԿʼʱٳ֡
+ӳÿ֡ʱ壨ƴ buf += dataĴС
+
+ĬϸǷͼֽڣ--decode ʵ JPEG Ϊءimage Ľﱻ滻
+ֻǷ֡stereo  parse_large_messages ֻ֡ԭʼֽڣڰ汾
+ʱÿ֡ imdecodeͼʱʧܣС--decode ʱĽʱ
+
+ֿ bench_parsers_baseline.json 뱾űʱĽʵĬϲɵ
+stereo ֡룩֮ĸĶԱȣ
+
+    python bench_parsers.py --save-baseline bench_parsers_baseline.json
+    python bench_parsers.py --compare bench_parsers_baseline.json
+"""
+import argparse
+import json
+import os
+import struct
+import time
+import tracemalloc
+
+import numpy as np
+import cv2
+
+import tcp_receive_image as tri
+import tcp_receive_stero as trs
+from recv_ring import RecvRing
+
+DEFAULT_SIZES = [16 * 1024, 128 * 1024, 1024 * 1024]
+CHUNKINGS = ['4k', 'split-header', 'whole']
+
+
+class CountingDecoder:
+    """ DecodePoolֻƲ"""
+
+    def __init__(self):
+        self.frames = 0
+
+    def submit(self, chunk):
+        self.frames += 1
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {'submitted': self.frames}
+
+
+# ---------- ϳ ----------
+def make_payload(size, decode, seed=0):
+    if not decode:
+        # ͼֽڣʹҲʶļͷʱ
+        return np.random.default_rng(seed).integers(0, 255, size, dtype=np.uint8).tobytes()
+    side = max(int((size / 0.4) ** 0.5), 16)
+    img = np.random.default_rng(seed).integers(0, 255, (side // 2, side, 3), dtype=np.uint8)
+    img = cv2.GaussianBlur(img, (0, 0), 3)
+    ok, enc = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
+    return enc.tobytes()
+
+
+def image_stream(payload, frames, image_ratio):
+    """ (ֽ, ÿϢͷƫ)ͼȲ"""
+    parts = []
+    headers = []
+    offset = 0
+    every = int(round(1 / image_ratio)) if image_ratio > 0 else 0
+    for i in range(frames):
+        if every and i % every == every - 1:
+            cmd = b'image'
+            msg = (tri.DELIM + b'\x00' + struct.pack('>L', len(cmd)) + cmd + tri.DELIM
+                   + struct.pack('>L', len(payload)) + payload)
+            headers.append(offset + len(msg) - len(payload) - 4)
+        else:
+            msg = struct.pack('>L', len(payload)) + payload
+            headers.append(offset)
+        parts.append(msg)
+        offset += len(msg)
+    return b''.join(parts), headers
+
+
+def stereo_stream(payload, frames):
+    msg = struct.pack('>L', len(payload) + 1) + b'\x01' + payload
+    return msg * frames, [i * len(msg) for i in range(frames)]
+
+
+def split_stream(data, headers, chunking):
+    if chunking == 'whole':
+        return [data]
+    if chunking == '4k':
+        return [data[i:i + 4096] for i in range(0, len(data), 4096)]
+    # split-headerÿ 4 ֽڳͷмһ
+    cuts = [0] + [h + 2 for h in headers if h + 2 < len(data)] + [len(data)]
+    return [data[a:b] for a, b in zip(cuts, cuts[1:]) if b > a]
+
+
+# ---------- ѭ ----------
+class ImageDriver:
+    name = 'image'
+
+    def __init__(self):
+        self.session = tri.ClientSession('bench', os.path.join('received_data', 'bench'))
+        self.session.decoder.close()
+        self.session.decoder = CountingDecoder()
+        self.ring = RecvRing(tri.RING_CAPACITY)
+
+    def feed(self, chunk):
+        view = self.ring.reserve(len(chunk))
+        view[:len(chunk)] = chunk
+        self.ring.commit(len(chunk))
+        tri.receive_into_ring(self.ring, self.session)
+
+
+class StereoDriver:
+    name = 'stereo'
+
+    def __init__(self):
+        self.buf = b''
+
+    def feed(self, chunk):
+        self.buf += chunk
+        self.buf = trs.parse_large_messages(self.buf)
+
+
+def run_case(driver_cls, chunks, frames, track_alloc):
+    driver = driver_cls()
+    start = time.perf_counter()
+    for chunk in chunks:
+        driver.feed(chunk)
+    elapsed = time.perf_counter() - start
+
+    alloc = None
+    if track_alloc:
+        driver = driver_cls()
+        tracemalloc.start()
+        total = 0
+        for chunk in chunks:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            driver.feed(chunk)
+            total += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+        alloc = total / frames
+    return frames / elapsed, alloc
+
+
+def run_all(args):
+    results = {}
+    for size in args.sizes:
+        payload = make_payload(size, args.decode)
+        frames = max(args.min_frames, int(args.target_mb * 1024 * 1024 / len(payload)))
+        cases = [('image', r, image_stream(payload, frames, r)) for r in args.image_ratio]
+        cases.append(('stereo', 0.0, stereo_stream(payload, frames)))
+
+        for proto, ratio, (data, headers) in cases:
+            driver_cls = ImageDriver if proto == 'image' else StereoDriver
+            for chunking in CHUNKINGS:
+                chunks = split_stream(data, headers, chunking)
+                fps, alloc = run_case(driver_cls, chunks, frames, not args.no_alloc)
+                key = f"{proto}/size={size}/chunk={chunking}" + (f"/image={ratio:g}" if proto == 'image' else '')
+                results[key] = {'frames_per_s': fps, 'alloc_bytes_per_frame': alloc}
+                alloc_text = '-' if alloc is None else f"{alloc / 1024:10.1f} KB"
+                print(f"{key:<48} {fps:12.0f} frames/s   {alloc_text}/֡")
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    print(f"\n {baseline_path} Աȣframes/s ֵ>1 ʾ죩")
+    for key, r in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        ratio = r['frames_per_s'] / base['frames_per_s']
+        alloc = ''
+        if r['alloc_bytes_per_frame'] is not None and base.get('alloc_bytes_per_frame') is not None:
+            alloc = f"   {base['alloc_bytes_per_frame'] / 1024:.1f} -> {r['alloc_bytes_per_frame'] / 1024:.1f} KB/֡"
+        print(f"{key:<48} x{ratio:6.2f}{alloc}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ն˽΢׼")
+    parser.add_argument('--sizes', type=lambda s: [int(x) for x in s.split(',')], default=DEFAULT_SIZES,
+                        help="֡С(ֽ)ŷָ")
+    parser.add_argument('--image-ratio', type=lambda s: [float(x) for x in s.split(',')], default=[0.0, 0.1],
+                        help="image Эдͼıŷָ")
+    parser.add_argument('--target-mb', type=float, default=32, help="ÿϴԼι(MB)")
+    parser.add_argument('--min-frames', type=int, default=20)
+    parser.add_argument('--decode', action='store_true', help="ʹʵ JPEG Ϊ")
+    parser.add_argument('--no-alloc', action='store_true', help="ͳƣtracemalloc ")
+    parser.add_argument('--save-baseline', default=None, help="ѽΪ JSON")
+    parser.add_argument('--compare', default=None, help="ָ JSON Ա")
+    args = parser.parse_args()
+
+    # ֻͼд
+    tri.store_raw_image = lambda data, save_dir=None: None
+    tri.save_large_image = lambda data, idx, save_dir=None: None
+
+    results = run_all(args)
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'decode': args.decode,
+                       'results': results}, f, indent=2, ensure_ascii=False)
+        print(f"\nѱ: {args.save_baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# -*- coding: gbk -*-
+"""ͼն²ԣԱȾɵ buf += data ƴ RecvRing ·
+
+ñ socketpair  10MB  image ͼֻ֡
+save_large_image / store_raw_image 滻Ϊղд̸Ž
+
+    python bench_receive_image.py --count 5 --size 10
+"""
+import argparse
+import os
+import socket
+import struct
+import threading
+import time
+
+import tcp_receive_image as tri
+from recv_ring import RecvRing
+
+LEGACY_RECV_SIZE = 4096
+
+
+def build_image_message(payload):
+    cmd = b'image'
+    return (tri.DELIM + b'\x00' + struct.pack('>L', len(cmd)) + cmd + tri.DELIM
+            + struct.pack('>L', len(payload)) + payload)
+
+
+def sender(sock, message, count):
+    try:
+        for _ in range(count):
+            sock.sendall(message)
+    finally:
+        sock.shutdown(socket.SHUT_WR)
+
+
+def receive_legacy(conn, session):
+    buf = b''
+    while True:
+        data = conn.recv(LEGACY_RECV_SIZE)
+        if not data:
+            break
+        buf += data
+        buf = buf[tri.parse_messages(buf, session):]
+
+
+def receive_ring(conn, session):
+    ring = RecvRing(tri.RING_CAPACITY)
+    while True:
+        if ring.recv_into(conn, tri.BUFFER_SIZE) == 0:
+            break
+        tri.receive_into_ring(ring, session)
+
+
+def run_case(name, receive, session, message, count):
+    a, b = socket.socketpair()
+    start_counter = session.image_counter
+    t = threading.Thread(target=sender, args=(a, message, count), daemon=True)
+    start = time.perf_counter()
+    t.start()
+    receive(b, session)
+    elapsed = time.perf_counter() - start
+    t.join()
+    a.close()
+    b.close()
+
+    received = session.image_counter - start_counter
+    mb = len(message) * count / (1024 * 1024)
+    print(f"{name:<8} {received}/{count}   {mb:.1f} MB  {elapsed:.3f} s  {mb / elapsed:.1f} MB/s")
+    return mb / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ͼն²")
+    parser.add_argument('--count', type=int, default=5, help="͵Ĵͼ")
+    parser.add_argument('--size', type=float, default=10, help="ÿͼС(MB)")
+    args = parser.parse_args()
+
+    # ֻ֡벻д
+    tri.save_large_image = lambda data, idx, save_dir=None: None
+    tri.store_raw_image = lambda data, save_dir=None: None
+    payload = bytes(int(args.size * 1024 * 1024) - 64)
+    message = build_image_message(payload)
+    session = tri.ClientSession('bench', os.path.join('received_data', 'bench'))
+
+    legacy = run_case('legacy', receive_legacy, session, message, args.count)
+    ring = run_case('ring', receive_ring, session, message, args.count)
+    print(f": {ring / legacy:.1f}x")
+    session.decoder.close()
+    tri.executor.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# -*- coding: gbk -*-
+"""ǰ棺ֽԤ㱣һʱѹ֡ʱѴǰĴ
+
+̸ʽ¼ͬmjpeg_record ķֶ MJPEG + ֱ
+``python mjpeg_record.py <Ŀ¼>`` طţĿ¼е trigger.txt ¼ʱ䡣
+"""
+import collections
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from mjpeg_record import MjpegRecorder
+
+
+class FrameRing:
+    """ڴ޵ѹ֡λ
+
+    append() ֻֽãơ룻ֽ budget_bytes
+    ֡ max_age ʱɵһ̭
+    """
+
+    def __init__(self, budget_bytes, max_age=None):
+        self.budget_bytes = budget_bytes
+        self.max_age = max_age
+        self.evicted = 0
+        self._frames = collections.deque()  # (ʱ, JPEG ֽ)
+        self._bytes = 0
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._frames)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def append(self, timestamp, jpeg):
+        with self._cond:
+            self._frames.append((timestamp, jpeg))
+            self._bytes += len(jpeg)
+            while len(self._frames) > 1 and (
+                    self._bytes > self.budget_bytes
+                    or (self.max_age is not None and self._frames[0][0] < timestamp - self.max_age)):
+                _, old = self._frames.popleft()
+                self._bytes -= len(old)
+                self.evicted += 1
+            self._cond.notify_all()
+
+    def window(self, start, end=None):
+        """ʱ [start, end] ڵ֡бֻã"""
+        with self._cond:
+            return [(ts, jpeg) for ts, jpeg in self._frames
+                    if ts >= start and (end is None or ts <= end)]
+
+    def wait_until(self, timestamp, timeout):
+        """ȵгֲ timestamp ֡ʱ緢Ͷֹͣ False"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._frames and self._frames[-1][0] >= timestamp, timeout)
+
+
+class BurstWriter:
+    """Ĵ
+
+    trigger() ڵ߳ȡ´ǰ֡ã֮ٱ̭ҲӰ죩
+    ȴ󴰿ںд̶ڵ߳ɣʾͽա
+    """
+
+    def __init__(self, ring, pre_seconds, post_seconds, name='burst'):
+        self.ring = ring
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+    def trigger(self, out_dir, trigger_ts):
+        pre = self.ring.window(trigger_ts - self.pre_seconds, trigger_ts)
+        return self._executor.submit(self._flush, out_dir, trigger_ts, pre)
+
+    def close(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _flush(self, out_dir, trigger_ts, pre):
+        end = trigger_ts + self.post_seconds
+        if self.post_seconds > 0:
+            self.ring.wait_until(end, self.post_seconds + 1.0)
+        last = pre[-1][0] if pre else trigger_ts - self.pre_seconds
+        frames = pre + [f for f in self.ring.window(last, end) if f[0] > last]
+        if not frames:
+            print(f"[{self.name}] Ϊգδ: {out_dir}")
+            return None
+
+        try:
+            rec = MjpegRecorder(out_dir)
+            try:
+                for ts, jpeg in frames:
+                    rec.append(jpeg, ts)
+            finally:
+                rec.close()
+            with open(os.path.join(out_dir, 'trigger.txt'), 'w') as f:
+                f.write(f"{trigger_ts:.6f}\n")
+        except OSError as e:
+            print(f"[{self.name}] ʧ {out_dir}: {e}")
+            return None
+
+        print(f"[{self.name}] ѱ {len(frames)} ֡ "
+              f"ǰ {len(pre)} ֡ {len(frames) - len(pre)} ֡: {out_dir}")
+        return out_dir
@@ -0,0 +1,181 @@
+# -*- coding: gbk -*-
+"""Ӧ壺 AudioRing ֮ϼĿӳٿơƯƲͶ
+
+- Ŀӳ٣̰߳ƶRFC 3550 ƽƽ
+  Ŀ = һ + һſ + JITTER_MULT  [min_latency, max_latency]
+- ƯƲصÿΰ ratio ٴӻȡԲֵɹ̶顣
+  ȣƽ󣩸Ŀʱ ratio Դ 1ĿʱС 1
+  ƫ max_driftϲѹԶĿʱֱӶĿȡ
+- أ岻ʱظһ鲢鵭
+  ܹĿȺָš
+
+read_into() صãм鶼Ԥȷ䣬صֻԭ㡣
+"""
+import time
+
+import numpy as np
+
+from audio_ring import AudioRing
+
+JITTER_MULT = 4.0  # Ŀӳжı
+DEPTH_SMOOTHING = 0.05  # ÿصԻָƽϵ
+DRIFT_GAIN = 0.02  # ƫĿ꣩ٱ
+PLC_DECAY = 0.4  # ʱÿ˥
+EXCESS_FACTOR = 3.0  # ȳĿô౶ʱֱӶĿ
+
+
+class JitterBuffer:
+    """߳ write()ص read_into()"""
+
+    def __init__(self, rate, capacity_seconds, block, min_latency=0.04, max_latency=0.5, max_drift=0.005):
+        self.rate = rate
+        self.block = block
+        self.min_latency = min_latency
+        self.max_latency = max_latency
+        self.max_drift = max_drift
+        self.ring = AudioRing(int(rate * capacity_seconds))
+
+        # ߳ά
+        self.target = int(min_latency * rate)
+        self.jitter = 0.0
+        self.overflow = 0
+        self._last_arrival = None
+        self._last_samples = 0
+
+        # صά
+        self.ratio = 1.0
+        self.underruns = 0
+        self.concealed = 0
+        self.trimmed = 0
+        self._playing = False
+        self._smoothed = 0.0
+        self._phase = 0.0
+        self._carry = 0.0
+        self._plc_gain = 0.0
+        self._fade_in = False
+        self._alloc(block)
+
+    def _alloc(self, frames):
+        # һλصȡ frames * (1 + max_drift) + 1 ²ټһнӲ
+        self._x = np.zeros(int(frames * (1 + self.max_drift)) + 3, dtype=np.float32)
+        self._ramp = np.arange(frames, dtype=np.float64)
+        self._pos = np.empty(frames, dtype=np.float64)
+        self._idx = np.empty(frames, dtype=np.intp)
+        self._idx1 = np.empty(frames, dtype=np.intp)
+        self._a = np.empty(frames, dtype=np.float32)
+        self._b = np.empty(frames, dtype=np.float32)
+        self._gain = np.empty(frames, dtype=np.float32)
+        self._unit = np.linspace(0, 1, frames, dtype=np.float32)
+        self._last = np.zeros(frames, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ring)
+
+    def reset_arrivals(self):
+        """ӿʼʱạ̃߳һӵĵʱ"""
+        self._last_arrival = None
+
+    def write(self, pcm):
+        """߳дһͬʱ¶ƺĿȣʵдĵ"""
+        now = time.perf_counter()
+        if self._last_arrival is not None:
+            d = (now - self._last_arrival) - self._last_samples / self.rate
+            self.jitter += (abs(d) - self.jitter) / 16
+        self._last_arrival, self._last_samples = now, len(pcm)
+
+        target = (len(pcm) + self.block) / self.rate + JITTER_MULT * self.jitter
+        self.target = int(min(max(target, self.min_latency), self.max_latency) * self.rate)
+
+        n = self.ring.write(pcm)
+        self.overflow += len(pcm) - n
+        return n
+
+    def read_into(self, out):
+        """ص outһά float32ŷ Trueػ򻺳з False"""
+        frames = len(out)
+        if frames > len(self._ramp):
+            self._alloc(frames)
+        target = self.target
+        depth = len(self.ring)
+
+        if not self._playing:
+            if depth < target:
+                self._conceal(out)
+                return False
+            self._playing = True
+            self._fade_in = True
+            self._smoothed = depth
+
+        if depth > target * EXCESS_FACTOR:
+            self.ring.discard(depth - target)
+            self.trimmed += depth - target
+            depth = target
+            self._smoothed = depth
+
+        self._smoothed += (depth - self._smoothed) * DEPTH_SMOOTHING
+        error = (self._smoothed - target) / max(target, 1)
+        ratio = 1.0 + min(max(error * DRIFT_GAIN, -self.max_drift), self.max_drift)
+        self.ratio = ratio
+
+        total = self._phase + frames * ratio
+        count = int(total)
+        if depth < count:
+            self.underruns += 1
+            self._playing = False
+            self._conceal(out)
+            return False
+
+        # x[0] ϴȡĲ k λ x ϵ phase + k * ratio 
+        x = self._x[:count + 1]
+        x[0] = self._carry
+        self.ring.read_into(x[1:])
+        pos = self._pos[:frames]
+        idx = self._idx[:frames]
+        idx1 = self._idx1[:frames]
+        a = self._a[:frames]
+        b = self._b[:frames]
+        np.multiply(self._ramp[:frames], ratio, out=pos)
+        pos += self._phase
+        np.copyto(idx, pos, casting='unsafe')
+        pos -= idx
+        np.add(idx, 1, out=idx1)
+        np.take(x, idx, out=a, mode='clip')
+        np.take(x, idx1, out=b, mode='clip')
+        b -= a
+        b *= pos
+        np.add(a, b, out=out)
+        self._carry = x[count]
+        self._phase = total - count
+
+        if self._fade_in:
+            out *= self._unit[:frames]
+            self._fade_in = False
+        self._last[:frames] = out
+        self._plc_gain = 1.0
+        return True
+
+    def _conceal(self, out):
+        """ظһ鲢ӵǰԵ PLC_DECAY С"""
+        frames = len(out)
+        g0 = self._plc_gain
+        if g0 <= 0.01:
+            self._plc_gain = 0.0
+            out[:] = 0
+            return
+        self.concealed += 1
+        g1 = g0 * PLC_DECAY
+        gain = self._gain[:frames]
+        np.multiply(self._unit[:frames], g1 - g0, out=gain)
+        gain += g0
+        np.multiply(self._last[:frames], gain, out=out)
+        self._plc_gain = g1
+
+    def latency(self):
+        """ǰɵӳ٣룩ӳ"""
+        return len(self.ring) / self.rate
+
+    def report(self):
+        return (f" {self.latency() * 1000:.0f} ms / Ŀ {self.target / self.rate * 1000:.0f} ms"
+                f" {self.jitter * 1000:.1f} ms {(self.ratio - 1) * 100:+.2f}%"
+                f"Ƿ {self.underruns} Σ {self.concealed} 飬"
+                f" {self.trimmed + self.overflow} ")
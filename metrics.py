@@ -0,0 +1,157 @@
+# -*- coding: gbk -*-
+"""նָ꣺ / Ǳ / ֱͼ Prometheus ıʽͨ HTTP ¶
+
+ĬϹرաû RECEIVER_METRICS=1 ն˼ɿ
+    RECEIVER_METRICS=1 python tcp_receive_stero.py
+    curl http://127.0.0.1:9102/metrics
+
+رʱ counter() / gauge() / histogram() ͬһն·ϵĵֻ
+һʲôķãserve() Ҳ HTTP ̡߳
+"""
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_ENABLED = os.environ.get('RECEIVER_METRICS', '0') not in ('', '0')
+METRICS_HOST = '127.0.0.1'
+
+# Ϊλ 0.1ms  2.5s
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+class _NullMetric:
+    """رָʱʹõĿն"""
+
+    def inc(self, n=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+NULL_METRIC = _NullMetric()
+
+
+class Counter:
+    """߳ += ʧͳӰ"""
+
+    type = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def samples(self):
+        yield self.name, self.value
+
+
+class Gauge:
+    """˲ʱֵ fn ʱÿץȡʱ fn() ȡֵ·ûп"""
+
+    type = 'gauge'
+
+    def __init__(self, name, help_text, fn=None):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self.fn = fn
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        yield self.name, self.fn() if self.fn is not None else self.value
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield f'{self.name}_bucket{{le="{bound}"}}', total
+        total += self.counts[-1]
+        yield f'{self.name}_bucket{{le="+Inf"}}', total
+        yield f'{self.name}_sum', self.sum
+        yield f'{self.name}_count', total
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def counter(name, help_text):
+    return _register(Counter(name, help_text)) if METRICS_ENABLED else NULL_METRIC
+
+
+def gauge(name, help_text, fn=None):
+    return _register(Gauge(name, help_text, fn)) if METRICS_ENABLED else NULL_METRIC
+
+
+def histogram(name, help_text, buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, help_text, buckets)) if METRICS_ENABLED else NULL_METRIC
+
+
+def render():
+    """ Prometheus ıʽȫָ"""
+    lines = []
+    with _registry_lock:
+        metrics = list(_registry)
+    for metric in metrics:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for name, value in metric.samples():
+            lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def serve(port, host=METRICS_HOST):
+    """ں̨߳ /metrics ˵㣻δָʱʲô"""
+    if not METRICS_ENABLED:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    print(f"[Metrics] http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,204 @@
+# -*- coding: gbk -*-
+"""ֶ MJPEG ¼
+
+һ¼һĿ¼ɶΣ
+    seg_00000.mjpg  ԭʼ JPEG ֡βӣ±
+    seg_00000.idx   ÿ֡һ¼ <ƫ u64, ʱ f64,  u32> 20 ֽ
+֡ŵ¼λԻ㣬һ֡ O(1) λ
+˳طֻǶ .mjpg ˳
+
+¼ڴÿ FLUSH_FRAMES ֡ FLUSH_SECONDS  .mjpg ˢļд .idx
+쳣˳ʱһСΣҲָûд֡
+
+طţ
+    python mjpeg_record.py received_data/video/<¼Ŀ¼> --speed 1.0
+"""
+import argparse
+import bisect
+import os
+import struct
+import time
+
+import numpy as np
+import cv2
+
+INDEX_RECORD = struct.Struct('<QdI')
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('ts', '<f8'), ('length', '<u4')])
+SEGMENT_MAX_BYTES = 512 * 1024 * 1024  # ޣ¶
+WRITE_BUFFER = 4 * 1024 * 1024
+FLUSH_FRAMES = 30  # ÿô֡ˢһݺ
+FLUSH_SECONDS = 1.0  # ϴˢ³ô
+READ_BUFFER = 4 * 1024 * 1024
+
+
+def segment_paths(directory, n):
+    base = os.path.join(directory, f"seg_{n:05d}")
+    return base + '.mjpg', base + '.idx'
+
+
+class MjpegRecorder:
+    """˳׷дԭʼ JPEG ֡ͬд"""
+
+    def __init__(self, directory, segment_max_bytes=SEGMENT_MAX_BYTES):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.frames = 0
+        self._segment = -1
+        self._data = None
+        self._index = None
+        self._offset = 0
+        self._pending_index = bytearray()
+        self._flushed_at = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self._open_segment()
+
+    def append(self, jpeg, timestamp=None):
+        """׷һ֡jpeg  bytes  memoryview"""
+        if self._offset and self._offset + len(jpeg) > self.segment_max_bytes:
+            self._open_segment()
+        if timestamp is None:
+            timestamp = time.time()
+
+        self._data.write(jpeg)
+        self._pending_index += INDEX_RECORD.pack(self._offset, timestamp, len(jpeg))
+        self._offset += len(jpeg)
+        self.frames += 1
+        if (len(self._pending_index) >= FLUSH_FRAMES * INDEX_RECORD.size
+                or time.monotonic() - self._flushed_at >= FLUSH_SECONDS):
+            self.flush()
+
+    def flush(self):
+        """Ȱ֡ˢļдӦ¼"""
+        if self._data is None:
+            return
+        self._data.flush()
+        if self._pending_index:
+            self._index.write(self._pending_index)
+            self._index.flush()
+            self._pending_index.clear()
+        self._flushed_at = time.monotonic()
+
+    def close(self):
+        if self._data is not None:
+            self.flush()
+            self._data.close()
+            self._index.close()
+            self._data = self._index = None
+
+    def _open_segment(self):
+        self.close()
+        self._segment += 1
+        data_path, index_path = segment_paths(self.directory, self._segment)
+        self._data = open(data_path, 'wb', buffering=WRITE_BUFFER)
+        self._index = open(index_path, 'wb', buffering=64 * 1024)
+        self._offset = 0
+
+
+class MjpegRecording:
+    """¼ȡ֡Żʱ䶨λ˳ط"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._indexes = []
+        self._starts = []
+        total = 0
+        n = 0
+        while True:
+            data_path, index_path = segment_paths(directory, n)
+            if not os.path.exists(index_path):
+                break
+            # джʱһ¼ܲضϣ֡ݲļ¼Ҳȥ
+            count = os.path.getsize(index_path) // INDEX_DTYPE.itemsize
+            index = np.fromfile(index_path, dtype=INDEX_DTYPE, count=count)
+            size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+            complete = index['offset'] + index['length'] <= size
+            if not complete.all():
+                index = index[:int(np.argmin(complete))]
+            self._indexes.append(index)
+            self._starts.append(total)
+            total += len(index)
+            n += 1
+        self._count = total
+        self._timestamps = (np.concatenate([idx['ts'] for idx in self._indexes])
+                            if self._indexes else np.empty(0, np.float64))
+        self._files = {}
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def timestamps(self):
+        return self._timestamps
+
+    def _locate(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(f"֡Խ: {i}")
+        seg = bisect.bisect_right(self._starts, i) - 1
+        return seg, self._indexes[seg][i - self._starts[seg]]
+
+    def frame_bytes(self, i):
+        """ i ֡ԭʼ JPEG ֽ"""
+        seg, rec = self._locate(i)
+        f = self._files.get(seg)
+        if f is None:
+            f = self._files[seg] = open(segment_paths(self.directory, seg)[0], 'rb')
+        f.seek(int(rec['offset']))
+        return f.read(int(rec['length']))
+
+    def frame(self, i, flags=cv2.IMREAD_COLOR):
+        return cv2.imdecode(np.frombuffer(self.frame_bytes(i), np.uint8), flags)
+
+    def index_at(self, timestamp):
+        """ʱ timestamp һ֡֡"""
+        return max(int(np.searchsorted(self._timestamps, timestamp, side='right')) - 1, 0)
+
+    def iter_frames(self, start=0):
+        """ start ֡ʼ˳ (ʱ, JPEG ֽ)δ˳ȡ"""
+        if start >= self._count:
+            return
+        seg, _ = self._locate(start)
+        first = start - self._starts[seg]
+        for s in range(seg, len(self._indexes)):
+            index = self._indexes[s]
+            with open(segment_paths(self.directory, s)[0], 'rb', buffering=READ_BUFFER) as f:
+                if first < len(index):
+                    f.seek(int(index['offset'][first]))
+                for rec in index[first:]:
+                    yield float(rec['ts']), f.read(int(rec['length']))
+            first = 0
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+
+def replay(directory, start=0, speed=1.0):
+    rec = MjpegRecording(directory)
+    print(f"[Replay] {directory}: {len(rec)} ֡")
+    t0 = None
+    wall0 = time.perf_counter()
+    for ts, jpeg in rec.iter_frames(start):
+        if t0 is None:
+            t0 = ts
+        if speed > 0:
+            delay = (ts - t0) / speed - (time.perf_counter() - wall0)
+            if delay > 0:
+                time.sleep(delay)
+        frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        if frame is not None:
+            cv2.imshow('Replay', frame)
+        if cv2.waitKey(1) & 0xFF == 27:
+            break
+    cv2.destroyAllWindows()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="MJPEG ¼ط")
+    parser.add_argument('directory', help="¼Ŀ¼")
+    parser.add_argument('--start', type=int, default=0, help="ʼ֡")
+    parser.add_argument('--speed', type=float, default=1.0, help="طű٣0 ʾط")
+    args = parser.parse_args()
+    replay(args.directory, args.start, args.speed)
@@ -0,0 +1,75 @@
+# -*- coding: gbk -*-
+"""ջλ壺recv_into ֱдԤ bytearrayֻ memoryview Ƭ"""
+
+
+class RecvRing:
+    """Ԥջ
+
+    [start, end) յδݡɺ consume() ǰ start
+    βռ䲻ʱδβͰᵽͷֻڲصʱԭذᶯ
+    ϢʱݡÿֻֽΣ
+     ``buf += data`` Ϣȶ
+    """
+
+    def __init__(self, capacity=1024 * 1024):
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self._pinned = False
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def capacity(self):
+        return len(self._buf)
+
+    def recv_into(self, sock, nbytes):
+        """ socket  nbytes ֽڵβضֽ0 ʾԶ˹رգ"""
+        n = sock.recv_into(self.reserve(nbytes), nbytes)
+        self.commit(n)
+        return n
+
+    def reserve(self, nbytes):
+        """ػβд nbytes ֽڵ memoryviewд commit() ύ"""
+        self._reserve(nbytes)
+        return self._view[self._end:self._end + nbytes]
+
+    def commit(self, n):
+        self._end += n
+
+    def data(self):
+        """δݵ memoryviewһдǰЧ"""
+        return self._view[self._start:self._end]
+
+    def consume(self, n):
+        self._start += n
+        if self._start == self._end and not self._pinned:
+            self._start = self._end = 0
+
+    def pin(self):
+        """ѽƬ̨У֮ٸõǰ洢ѽ"""
+        self._pinned = True
+
+    def _reserve(self, nbytes):
+        if len(self._buf) - self._end >= nbytes:
+            return
+
+        pending = self._end - self._start
+        if self._pinned or pending > self._start or pending + nbytes > len(self._buf):
+            # һ´洢ɴ洢ԳƬͷ
+            capacity = len(self._buf)
+            while capacity < pending + nbytes:
+                capacity *= 2
+            buf = bytearray(capacity)
+            buf[:pending] = self._view[self._start:self._end]
+            self._buf = buf
+            self._view = memoryview(buf)
+            self._pinned = False
+        else:
+            # δβĿصԭذᵽͷ
+            self._view[:pending] = self._view[self._start:self._end]
+
+        self._start = 0
+        self._end = pending
@@ -1,15 +1,72 @@
 import sys
 import subprocess
 import os
+import secrets
+import time
+from multiprocessing import AuthenticationError
+from PyQt5.QtCore import QThread, pyqtSignal
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton,
                              QVBoxLayout, QWidget, QLabel, QFileDialog,
                              QMessageBox, QLineEdit)
 
+from voice_service import AUTHKEY_ENV, detect_remote, format_result
+
+
+SERVICE_START_WAIT = 10.0  # 服务进程在跑但还没开始监听时，最多等多久再退回单独检测
+
+
+class DetectThread(QThread):
+    """后台把文件交给常驻检测服务，结果通过信号回到界面线程
+
+    只有连不上服务且服务进程已退出（或等到 SERVICE_START_WAIT 仍连不上）时才发 unavailable，
+    服务还活着时的超时按检测失败处理：再单独跑一次 voice_detect.py 只会重复加载模型、和服务抢着重建索引。
+    """
+    result_ready = pyqtSignal(str, dict)
+    failed = pyqtSignal(str, str)
+    unavailable = pyqtSignal(str)
+    loading = pyqtSignal(str)
+
+    def __init__(self, audio_path, authkey, service_alive):
+        super().__init__()
+        self.audio_path = audio_path
+        self.authkey = authkey
+        self.service_alive = service_alive
+
+    def run(self):
+        deadline = time.monotonic() + SERVICE_START_WAIT
+        while True:
+            try:
+                result = detect_remote(self.audio_path, authkey=self.authkey,
+                                       on_loading=lambda: self.loading.emit(self.audio_path))
+            except TimeoutError as e:
+                if self.service_alive():
+                    self.failed.emit(self.audio_path, str(e))
+                else:
+                    self.unavailable.emit(self.audio_path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                # 服务刚拉起还没开始监听：进程还在就稍等重连
+                if self.service_alive() and time.monotonic() < deadline:
+                    time.sleep(0.5)
+                    continue
+                self.unavailable.emit(self.audio_path)
+            except (OSError, EOFError, AuthenticationError):
+                # 服务启动失败或中途退出，或占着地址的不是本窗口拉起的服务
+                self.unavailable.emit(self.audio_path)
+            except Exception as e:
+                self.failed.emit(self.audio_path, str(e))
+            else:
+                self.result_ready.emit(self.audio_path, result)
+            return
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.processes = {}  # 存储所有子进程
+        self.detect_threads = []  # 进行中的检测请求
+        self.closing = False
+        # 与本窗口拉起的检测服务互相认证用的随机密钥，经环境变量交给服务
+        self.service_key = secrets.token_hex(32)
         self.init_ui()
         self.init_processes()
 
@@ -81,6 +138,9 @@ class MainWindow(QMainWindow):
         try:
             self.processes['handle'] = subprocess.Popen(['python', 'handle.py'])
             self.processes['test32'] = subprocess.Popen(['python', 'test_32.py'])
+            # 声纹检测服务启动时就加载模型，检测时不再每次冷启动
+            self.processes['voice_service'] = subprocess.Popen(
+                ['python', 'voice_service.py'], env=dict(os.environ, **{AUTHKEY_ENV: self.service_key}))
             self.status_label.setText("已启动手柄与32测试程序")
         except Exception as e:
             self.status_label.setText(f"启动失败: {e}")
@@ -161,13 +221,43 @@ class MainWindow(QMainWindow):
         if not os.path.exists(audio_path):
             QMessageBox.warning(self, "错误", f"文件{audio_path}不存在")
             return
+        thread = DetectThread(audio_path, self.service_key.encode(), self.service_alive)
+        thread.result_ready.connect(self.on_detect_result)
+        thread.failed.connect(self.on_detect_failed)
+        thread.unavailable.connect(self.detect_audio_process)
+        thread.loading.connect(self.on_detect_loading)
+        thread.finished.connect(lambda: self.detect_threads.remove(thread))
+        self.detect_threads.append(thread)
+        thread.start()
+        self.status_label.setText(f"正在检测音频文件: {file_name}")
+
+    def service_alive(self):
+        proc = self.processes.get('voice_service')
+        return proc is not None and proc.poll() is None
+
+    def detect_audio_process(self, audio_path):
+        """检测服务不可用时退回单独运行 voice_detect.py"""
+        if self.closing:
+            return
         try:
             self.processes['detect'] = subprocess.Popen(
                 ['python', 'voice_detect.py', '--audio_path1', audio_path])
-            self.status_label.setText(f"正在检测音频文件: {file_name}")
+            self.status_label.setText(f"检测服务未运行，已单独启动检测: {os.path.basename(audio_path)}")
         except Exception as e:
             QMessageBox.critical(self, "错误", f"无法启动音频检测: {e}")
 
+    def on_detect_result(self, audio_path, result):
+        self.status_label.setText(f"{os.path.basename(audio_path)}: {result['best']} "
+                                  f"({result['score']:.4f})")
+        QMessageBox.information(self, "检测结果", format_result(result))
+
+    def on_detect_loading(self, audio_path):
+        self.status_label.setText(f"检测服务正在加载模型，稍后检测: {os.path.basename(audio_path)}")
+
+    def on_detect_failed(self, audio_path, error):
+        self.status_label.setText(f"检测失败: {os.path.basename(audio_path)}")
+        QMessageBox.warning(self, "错误", f"检测 {audio_path} 失败: {error}")
+
     def open_cut_tool(self):
         """打开外部音频切割程序"""
         try:
@@ -177,10 +267,13 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "错误", f"无法启动音频切割工具: {e}")
 
     def closeEvent(self, event):
+        self.closing = True
         for name, proc in self.processes.items():
             if proc.poll() is None:
                 proc.terminate()
                 proc.wait()
+        for thread in list(self.detect_threads):
+            thread.wait()
         event.accept()
 
 
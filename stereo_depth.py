@@ -0,0 +1,191 @@
+# -*- coding: gbk -*-
+"""˫ĿʵʱȣУͼϼӲSGBM / BM
+
+Ϊ CPU ϱĿ֡ʣ
+    * levels pyrDown С levels ƥ䣬ֱÿһʱԼ 1/4~1/8
+    * stripsͼг̳߳вƥ䣨OpenCV ʱͷ GIL
+      ¸ STRIP_OVERLAP ٲõƴӴͼƥһ¡
+ӲͳһΪȫֱصλ = f * B / ӲfB ȡͶӰ
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+DEPTH_ALGORITHM = 'sgbm'  # 'sgbm' ã'bm' 
+DEPTH_LEVELS = 1  # ƥǰ pyrDown Ĵ
+DEPTH_NUM_DISPARITIES = 128  # ȫֱµӲأС󰴱
+DEPTH_BLOCK_SIZE = 5
+DEPTH_STRIPS = max(1, os.cpu_count() or 1)
+STRIP_OVERLAP = 16
+
+
+class DepthEngine:
+    def __init__(self, left_params, right_params, algorithm=DEPTH_ALGORITHM, levels=DEPTH_LEVELS,
+                 num_disparities=DEPTH_NUM_DISPARITIES, block_size=DEPTH_BLOCK_SIZE, strips=DEPTH_STRIPS):
+        if algorithm not in ('sgbm', 'bm'):
+            raise ValueError(f"δ֪ƥ㷨: {algorithm}")
+        self.algorithm = algorithm
+        self.levels = levels
+        self.scale = 2 ** levels
+        # ӲΧ 16 ı
+        self.num_disparities = max(16, (num_disparities // self.scale + 15) // 16 * 16)
+        self.block_size = block_size | 1
+        self.strips = strips
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=strips) if strips > 1 else None
+
+        proj_l = left_params[3]
+        proj_r = right_params[3]
+        self.focal = float(proj_l[0, 0])
+        self.baseline = -float(proj_r[0, 3]) / float(proj_r[0, 0]) if proj_r[0, 0] else 0.0
+
+    def _matcher(self):
+        # ƥ󲻱֤̰߳ȫÿ̸߳һ
+        matcher = getattr(self._local, 'matcher', None)
+        if matcher is None:
+            if self.algorithm == 'bm':
+                matcher = cv2.StereoBM_create(numDisparities=self.num_disparities, blockSize=max(self.block_size, 5))
+            else:
+                channels = 1
+                matcher = cv2.StereoSGBM_create(
+                    minDisparity=0,
+                    numDisparities=self.num_disparities,
+                    blockSize=self.block_size,
+                    P1=8 * channels * self.block_size ** 2,
+                    P2=32 * channels * self.block_size ** 2,
+                    uniquenessRatio=10,
+                    speckleWindowSize=100,
+                    speckleRange=2,
+                    mode=cv2.STEREO_SGBM_MODE_SGBM_3WAY,
+                )
+            self._local.matcher = matcher
+        return matcher
+
+    def _match_strip(self, left, right, y0, y1):
+        pad = max(self.block_size, STRIP_OVERLAP)
+        a = max(0, y0 - pad)
+        b = min(left.shape[0], y1 + pad)
+        disp = self._matcher().compute(left[a:b], right[a:b])
+        return disp[y0 - a:y1 - a]
+
+    def compute(self, left, right):
+        """УͼBGR Ҷȣȫֱصλ float32 ӲͼСĳߴ磩"""
+        if left.ndim == 3:
+            left = cv2.cvtColor(left, cv2.COLOR_BGR2GRAY)
+            right = cv2.cvtColor(right, cv2.COLOR_BGR2GRAY)
+        for _ in range(self.levels):
+            left = cv2.pyrDown(left)
+            right = cv2.pyrDown(right)
+
+        h = left.shape[0]
+        if self._pool is None:
+            raw = self._matcher().compute(left, right)
+        else:
+            bounds = np.linspace(0, h, self.strips + 1, dtype=int)
+            futures = [self._pool.submit(self._match_strip, left, right, y0, y1)
+                       for y0, y1 in zip(bounds[:-1], bounds[1:]) if y1 > y0]
+            raw = np.vstack([f.result() for f in futures])
+
+        # ƥ 4 λСĶٳСȫֱ
+        disparity = raw.astype(np.float32) * (self.scale / 16.0)
+        disparity[raw <= 0] = 0
+        return disparity
+
+    def depth(self, disparity):
+        """Ӳתȣλ궨Ļһ£ЧӲΪ 0"""
+        depth = np.zeros_like(disparity)
+        if self.baseline > 0:
+            valid = disparity > 0
+            depth[valid] = self.focal * self.baseline / disparity[valid]
+        return depth
+
+    def colorize(self, disparity):
+        max_disp = self.num_disparities * self.scale
+        img = np.clip(disparity * (255.0 / max_disp), 0, 255).astype(np.uint8)
+        return cv2.applyColorMap(img, cv2.COLORMAP_JET)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+
+class DepthResult:
+    __slots__ = ('seq', 'disparity', 'depth', 'color', 'fps', 'latency', 'compute_time')
+
+    def __init__(self, seq, disparity, depth, color, fps, latency, compute_time):
+        self.seq = seq
+        self.disparity = disparity
+        self.depth = depth
+        self.color = color
+        self.fps = fps
+        self.latency = latency
+        self.compute_time = compute_time
+
+
+def draw_readout(result, engine):
+    """αɫӲͼϵ֡ / ʱ / ֱϢ"""
+    img = result.color.copy()
+    h, w = img.shape[:2]
+    text = (f"{engine.algorithm.upper()} {w}x{h} L{engine.levels}  "
+            f"{result.fps:.1f} fps  {result.compute_time * 1000:.0f} ms  lat {result.latency * 1000:.0f} ms")
+    cv2.putText(img, text, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    return img
+
+
+def save_depth(result, out_dir, stamp):
+    """αɫӲͼjpgԺΪλ 16 λͼpng"""
+    os.makedirs(out_dir, exist_ok=True)
+    color_path = os.path.join(out_dir, f"disparity_{stamp}.jpg")
+    depth_path = os.path.join(out_dir, f"depth_{stamp}.png")
+    ok1 = cv2.imwrite(color_path, result.color)
+    depth_mm = np.clip(result.depth * 1000.0, 0, 65535).astype(np.uint16)
+    ok2 = cv2.imwrite(depth_path, depth_mm)
+    return ok1 and ok2, color_path, depth_path
+
+
+class DepthWorker:
+    """ֻ̨̣߳֡Ŀ֡٣ latest ʾ߳ȡ"""
+
+    def __init__(self, engine, get_pair, target_fps=10.0):
+        """get_pair()  (, ʱ, Уͼ, Уͼ)  None"""
+        self.engine = engine
+        self.get_pair = get_pair
+        self.interval = 1.0 / target_fps if target_fps > 0 else 0
+        self.latest = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='depth', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2)
+        self.engine.close()
+
+    def _run(self):
+        last_seq = None
+        fps = 0.0
+        last_done = time.perf_counter()
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            pair = self.get_pair(last_seq)
+            if pair is None:
+                self._stop.wait(0.005)
+                continue
+            seq, arrived, left, right = pair
+            last_seq = seq
+
+            disparity = self.engine.compute(left, right)
+            depth = self.engine.depth(disparity)
+            done = time.perf_counter()
+            fps = 0.8 * fps + 0.2 / max(done - last_done, 1e-6) if fps else 1.0 / max(done - start, 1e-6)
+            last_done = done
+            self.latest = DepthResult(seq, disparity, depth, self.engine.colorize(disparity),
+                                      fps, time.time() - arrived, done - start)
+
+            wait = self.interval - (time.perf_counter() - start)
+            if wait > 0:
+                self._stop.wait(wait)
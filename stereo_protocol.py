@@ -0,0 +1,265 @@
+# -*- coding: gbk -*-
+"""˫ĿͼЭ飺֡ʽʱϢ·ͳƣն˺ͻطŹ߹
+
+ÿϢ ``>L  + 1 ֽ + ``Ȱֽڣ
+
+    0x01  JPEG ֡ɸʽûźʱ
+    0x02  ͷ JPEG ֡ͷ >BBIQ = ͷ汾ͷȡ֡šɼʱ(us)
+          ֮ JPEGն˰ͷͷԺͷĩβ׷ֶβӰɽն
+    0x03  ͷֱԤ֡ͷΪ 0x02 ͷ׷ >HH = ȫֱʿߣ
+          JPEG Ϊ˫ĿͼСĽ
+    0x04  ȫֱ֡Ӧ𣨷Ͷ -> նˣͷͬ 0x02Ϊţ
+          Ͷûи֡ʱ JPEG Ϊ
+    0x10  ʱ󣨽ն -> Ͷˣ>Q ն˷ʱ(us)
+    0x11  ʱӦ𣨷Ͷ -> նˣ>QQ ԭصʱ䡢Ͷʱ(us)
+    0x12  ȫֱ֡󣨽ն -> Ͷˣ>I Ԥ֡
+
+ʱɽն˷ֻյ 0x02/0x03 ֡ϽУֻ 0x01 ľɷͶ
+յκݡʱ䶼ǸԵ time.time()΢ơ
+
+ԤʱͶ豣һʱȫֱ JPEGӦ 0x12
+"""
+import collections
+import struct
+import threading
+import time
+
+import numpy as np
+
+FRAME_JPEG = 0x01
+FRAME_JPEG_V2 = 0x02
+FRAME_PREVIEW = 0x03
+FRAME_FULL = 0x04
+CLOCK_PING = 0x10
+CLOCK_PONG = 0x11
+FULL_REQUEST = 0x12
+
+HEADER_VERSION = 1
+FRAME_HEADER = struct.Struct('>BBIQ')
+PING = struct.Struct('>Q')
+PONG = struct.Struct('>QQ')
+REQUEST = struct.Struct('>I')
+PREVIEW_SIZE = struct.Struct('>HH')
+SEQ_MOD = 1 << 32
+
+
+def now_us():
+    return time.time_ns() // 1000
+
+
+def message(frame_type, payload):
+    return struct.pack('>L', len(payload) + 1) + bytes([frame_type]) + payload
+
+
+def jpeg_frame(jpeg):
+    return message(FRAME_JPEG, jpeg)
+
+
+def jpeg_frame_v2(jpeg, seq, capture_us=None, frame_type=FRAME_JPEG_V2, extra=b''):
+    if capture_us is None:
+        capture_us = now_us()
+    header = FRAME_HEADER.pack(HEADER_VERSION, FRAME_HEADER.size + len(extra), seq % SEQ_MOD, capture_us)
+    return message(frame_type, header + extra + jpeg)
+
+
+def preview_frame(jpeg, seq, full_size, capture_us=None):
+    """full_size ΪӦȫֱͼ (, )"""
+    return jpeg_frame_v2(jpeg, seq, capture_us, FRAME_PREVIEW, PREVIEW_SIZE.pack(*full_size))
+
+
+def full_response(jpeg, seq, capture_us=None):
+    """ͶãӦ 0x12jpeg Ϊ None ʾ֡Ѳڻ"""
+    return jpeg_frame_v2(jpeg or b'', seq, capture_us, FRAME_FULL)
+
+
+def full_request(seq):
+    return message(FULL_REQUEST, REQUEST.pack(seq % SEQ_MOD))
+
+
+def parse_frame_header(buf, start, end):
+    """ buf[start:end] е 0x02 ֡ݣ (, ɼʱus, JPEG ʼλ)
+    ͷʱ NoneֱڽջϽ"""
+    if end - start < FRAME_HEADER.size:
+        return None
+    _version, header_len, seq, capture_us = FRAME_HEADER.unpack_from(buf, start)
+    if header_len < FRAME_HEADER.size or header_len > end - start:
+        return None
+    return seq, capture_us, start + header_len
+
+
+def preview_full_size(buf, start):
+    """ͨ parse_frame_header  0x03 ֡ͷеȫֱ (, )ɷͶûиֶʱ None"""
+    if buf[start + 1] < FRAME_HEADER.size + PREVIEW_SIZE.size:
+        return None
+    return PREVIEW_SIZE.unpack_from(buf, start + FRAME_HEADER.size)
+
+
+def ping(t0_us=None):
+    return message(CLOCK_PING, PING.pack(now_us() if t0_us is None else t0_us))
+
+
+def pong(data):
+    """Ͷãյ 0x10 Ӧ"""
+    t0_us, = PING.unpack_from(data)
+    return message(CLOCK_PONG, PONG.pack(t0_us, now_us()))
+
+
+class FullFrameRequests:
+    """ն˰Ͷȡȫֱ֡
+
+    fetch()  0x12 ȴ߳յ 0x04 ʱ on_response() 
+    send Ϊ̰߳ȫķͺʱͬһӣ
+    """
+
+    def __init__(self, send, timeout=2.0):
+        self.send = send
+        self.timeout = timeout
+        self.closed = False
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, seq, timeout=None):
+        """ظŵȫֱ JPEG ֽڣʱͶûи֡ѶϿʱ None"""
+        if self.closed:
+            return None
+        with self._lock:
+            slot = self._pending.get(seq)
+            if slot is None:
+                slot = self._pending[seq] = [threading.Event(), None]
+                first = True
+            else:
+                first = False
+        if first:
+            try:
+                self.send(full_request(seq))
+            except OSError:
+                self.close()
+        slot[0].wait(self.timeout if timeout is None else timeout)
+        with self._lock:
+            if self._pending.get(seq) is slot:
+                del self._pending[seq]
+        return slot[1] or None
+
+    def on_response(self, seq, jpeg):
+        with self._lock:
+            slot = self._pending.get(seq)
+        if slot is not None:
+            slot[1] = jpeg
+            slot[0].set()
+
+    def close(self):
+        """ӶϿеȴ"""
+        self.closed = True
+        with self._lock:
+            slots, self._pending = list(self._pending.values()), {}
+        for slot in slots:
+            slot[0].set()
+
+
+class ClockSync:
+    """ƷͶʱԽն˵ƫ
+
+    offset = Ͷʱ - (󷢳ʱ + Ӧ𵽴ʱ) / 2Խ̹Խ׼
+    Աβȡʱ̵һΡ
+    """
+
+    def __init__(self, samples=8):
+        self._samples = collections.deque(maxlen=samples)
+        self.offset_us = None
+        self.rtt_us = None
+
+    def on_pong(self, data, t3_us=None):
+        t0_us, t1_us = PONG.unpack_from(data)
+        t3_us = now_us() if t3_us is None else t3_us
+        rtt = t3_us - t0_us
+        if rtt < 0:
+            return
+        self._samples.append((rtt, t1_us - (t0_us + t3_us) // 2))
+        self.rtt_us, self.offset_us = min(self._samples)
+
+    def to_local(self, sender_us):
+        """Ͷʱ任ɽն˵ time.time() 룻δʱʱ None"""
+        if self.offset_us is None:
+            return None
+        return (sender_us - self.offset_us) / 1e6
+
+
+class LinkStats:
+    """֡ͳƶ֡򣬲ɼʱͳʱ
+
+    report() ϴεͳƲ㴰ڡ
+    """
+
+    def __init__(self, ping_interval=2.0):
+        self.clock = ClockSync()
+        self.ping_interval = ping_interval
+        self.versioned = False
+        self.expected = None
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self._last_ping = 0.0
+        self._window = self._empty_window()
+
+    @staticmethod
+    def _empty_window():
+        return {'frames': 0, 'lost': 0, 'reordered': 0, 'network': [], 'decoded': []}
+
+    def on_frame(self, seq, capture_us, arrival):
+        """¼һ֡ 0x02/0x03ظ֡ɼʱ䣨նʱӣ룩δʱʱΪ None"""
+        self.versioned = True
+        self.received += 1
+        self._window['frames'] += 1
+        if self.expected is not None:
+            ahead = (seq - self.expected) % SEQ_MOD
+            if ahead < SEQ_MOD // 2:
+                # м֡ȼΪʧ֮ٵٸļΪ
+                self.lost += ahead
+                self._window['lost'] += ahead
+                self.expected = (seq + 1) % SEQ_MOD
+            else:
+                self.reordered += 1
+                self._window['reordered'] += 1
+                if self.lost > 0:
+                    self.lost -= 1
+                if self._window['lost'] > 0:
+                    self._window['lost'] -= 1
+        else:
+            self.expected = (seq + 1) % SEQ_MOD
+
+        capture_ts = self.clock.to_local(capture_us)
+        if capture_ts is not None:
+            self._window['network'].append(arrival - capture_ts)
+        return capture_ts
+
+    def on_decoded(self, latency):
+        self._window['decoded'].append(latency)
+
+    def ping_due(self, now=None):
+        """յ 0x02/0x03 ֡Ҿϴζʱʱ True"""
+        now = time.monotonic() if now is None else now
+        if not self.versioned or now - self._last_ping < self.ping_interval:
+            return False
+        self._last_ping = now
+        return True
+
+    def loss_rate(self):
+        total = self.received + self.lost
+        return self.lost / total if total else 0.0
+
+    def report(self):
+        w, self._window = self._window, self._empty_window()
+        if not w['frames']:
+            return None
+        total = w['frames'] + w['lost']
+        parts = [f"֡ {w['frames']}", f"ʧ {w['lost']} ({w['lost'] / total * 100 if total else 0:.1f}%)",
+                 f" {w['reordered']}"]
+        for name, key in (('ʱ', 'network'), ('ʱ', 'decoded')):
+            if w[key]:
+                p50, p95 = np.percentile(w[key], [50, 95]) * 1000
+                parts.append(f"{name} p50 {p50:.1f} ms p95 {p95:.1f} ms")
+        if self.clock.offset_us is None:
+            parts.append("δʱ")
+        else:
+            parts.append(f"ʱƫ {self.clock.offset_us / 1000:.1f} ms ( {self.clock.rtt_us / 1000:.1f} ms)")
+        return ''.join(parts)
@@ -0,0 +1,150 @@
+# -*- coding: gbk -*-
+"""˫Ŀ¼ƣÿһ֡ ת    У    д
+
+ת֡УڶвУ֡䣬ֻ̼ JPEG ֽڣ
+д̵д߳ɣ˳򲻹̶д̰߳֡ź
+Ŀֱ׷ӵ mjpeg_record ֶ¼֤¼еʱ
+кжޣд̸ʱϣ
+֮submit() ֱӶ֡ socket ̡߳
+"""
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import cv2
+
+from mjpeg_record import MjpegRecorder
+from stereo_rectify import get_rectifier
+
+RECORD_WORKERS = max(1, (os.cpu_count() or 2) - 2)  #  socket ʾ̵߳ĺ
+RECORD_QUEUE_SIZE = 8  # ÿ̵Ĵ֡
+RECORD_QUALITY = 100
+REPORT_INTERVAL = 5.0
+
+
+def split_rotated(frame):
+    """ȼ֡ת 180 ߲֣ÿһֻתԼ
+
+     (left, right) tcp_receive_stero.save_current_frame Լһ¡
+    """
+    half = frame.shape[1] // 2
+    left = cv2.rotate(frame[:, :frame.shape[1] - half], cv2.ROTATE_180)
+    right = cv2.rotate(frame[:, frame.shape[1] - half:], cv2.ROTATE_180)
+    return left, right
+
+
+def _record_worker(in_q, out_q, left_yaml, right_yaml, quality):
+    rectifier = get_rectifier(left_yaml, right_yaml)
+    params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+    while True:
+        item = in_q.get()
+        if item is None:
+            break
+        seq, ts, jpeg = item
+        frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            out_q.put((seq, ts, None, None))
+            continue
+        left, right = rectifier.rectify(*split_rotated(frame))
+        ok_l, enc_l = cv2.imencode('.jpg', left, params)
+        ok_r, enc_r = cv2.imencode('.jpg', right, params)
+        if not (ok_l and ok_r):
+            out_q.put((seq, ts, None, None))
+            continue
+        out_q.put((seq, ts, enc_l.tobytes(), enc_r.tobytes()))
+    out_q.put(None)
+
+
+class StereoRecorder:
+    """У¼ƣsubmit()  socket ̵߳ãֻһη"""
+
+    def __init__(self, out_dir, left_yaml, right_yaml, workers=RECORD_WORKERS,
+                 queue_size=RECORD_QUEUE_SIZE, quality=RECORD_QUALITY):
+        self.out_dir = out_dir
+        self.submitted = 0
+        self.dropped = 0
+        self.failed = 0
+        self.written = 0
+        self._seq = 0
+        ctx = mp.get_context('spawn')
+        self._in_q = ctx.Queue(maxsize=queue_size * workers)
+        self._out_q = ctx.Queue(maxsize=queue_size * workers)
+        self._workers = [
+            ctx.Process(target=_record_worker, args=(self._in_q, self._out_q, left_yaml, right_yaml, quality),
+                        daemon=True)
+            for _ in range(workers)
+        ]
+        for p in self._workers:
+            p.start()
+
+        self._left = MjpegRecorder(os.path.join(out_dir, 'left'))
+        self._right = MjpegRecorder(os.path.join(out_dir, 'right'))
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+        print(f"[Recorder] ʼ¼: {out_dir}{workers} ̣")
+
+    def submit(self, jpeg, timestamp=None):
+        """ύһ֡ԭʼ JPEGʱ False"""
+        self.submitted += 1
+        try:
+            self._in_q.put_nowait((self._seq, timestamp or time.time(), bytes(jpeg)))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self._seq += 1
+        return True
+
+    def close(self):
+        for _ in self._workers:
+            self._in_q.put(None)
+        self._writer.join()
+        for p in self._workers:
+            p.join(timeout=5)
+        self._left.close()
+        self._right.close()
+        print(f"[Recorder] ¼ƽ: {self.out_dir}д {self.written} ԣ {self.dropped} ֡ʧ {self.failed} ֡")
+
+    def _write_loop(self):
+        finished = 0
+        # ɵ֡ݴ棬ǰ֡дʧܵ֡Ҳռһţ⿨ס
+        done = {}
+        next_seq = 0
+        last_report = time.perf_counter()
+        last_written = last_dropped = 0
+        while finished < len(self._workers):
+            try:
+                item = self._out_q.get(timeout=REPORT_INTERVAL)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                finished += 1
+            elif item:
+                done[item[0]] = item[1:]
+                while next_seq in done:
+                    self._write_pair(*done.pop(next_seq))
+                    next_seq += 1
+
+            now = time.perf_counter()
+            if now - last_report >= REPORT_INTERVAL:
+                fps = (self.written - last_written) / (now - last_report)
+                dropped = self.dropped - last_dropped
+                msg = f"[Recorder] {fps:.1f} fpsд {self.written} "
+                if dropped:
+                    msg += f"ϣ{REPORT_INTERVAL:.0f} ڶ {dropped} ֡"
+                print(msg)
+                last_report, last_written, last_dropped = now, self.written, self.dropped
+
+        # й̶˳ʣµģ쳣˳ʱŻȱţд
+        for seq in sorted(done):
+            self._write_pair(*done[seq])
+
+    def _write_pair(self, ts, left, right):
+        if left is None:
+            self.failed += 1
+            return
+        self._left.append(left, ts)
+        self._right.append(right, ts)
+        self.written += 1
@@ -0,0 +1,115 @@
+# -*- coding: gbk -*-
+"""˫ĿУ궨붨Уӳ
+
+ӳͼߴֻһΣ CV_16SC2 ʽ棨remap  float32 죬
+ռڴҲֻһ룩Ա궨 YAML ݵĹϣΪ־ụ̂
+궨ʱ´ֱӶȡҪУĴ붼ͨ get_rectifier() ͬһݱ
+"""
+import hashlib
+import os
+import threading
+
+import numpy as np
+import cv2
+import yaml
+
+RECTIFY_CACHE_DIR = os.path.join('yaml', '.rectify_cache')
+
+
+def load_camera_params(yaml_path: str):
+    with open(yaml_path, "r") as f:
+        data = yaml.safe_load(f)
+    return params_from_yaml(data)
+
+
+def params_from_yaml(data):
+    cam_matrix = np.array(data["camera_matrix"]["data"]).reshape((3, 3))
+    dist_coeffs = np.array(data["distortion_coefficients"]["data"]).reshape((1, 5))
+    rect_matrix = np.array(data["rectification_matrix"]["data"]).reshape((3, 3))
+    proj_matrix = np.array(data["projection_matrix"]["data"]).reshape((3, 4))
+    return cam_matrix, dist_coeffs, rect_matrix, proj_matrix
+
+
+class StereoRectifier:
+    """Уӳ (, ) ڴʹ"""
+
+    def __init__(self, left_yaml, right_yaml, cache_dir=RECTIFY_CACHE_DIR):
+        with open(left_yaml, 'rb') as f:
+            left_raw = f.read()
+        with open(right_yaml, 'rb') as f:
+            right_raw = f.read()
+        self.left_params = params_from_yaml(yaml.safe_load(left_raw))
+        self.right_params = params_from_yaml(yaml.safe_load(right_raw))
+        self.cache_dir = cache_dir
+        # OpenCV 汾ͬɵıܲͬһ
+        self.key = hashlib.sha1(left_raw + b'\0' + right_raw + b'\0' + cv2.__version__.encode()).hexdigest()[:16]
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def maps(self, size):
+        """ (( map1,  map2), ( map1,  map2))size ΪĿͼ (, )"""
+        size = (int(size[0]), int(size[1]))
+        maps = self._maps.get(size)
+        if maps is None:
+            with self._lock:
+                maps = self._maps.get(size)
+                if maps is None:
+                    maps = self._load(size)
+                    if maps is None:
+                        maps = self._build(size)
+                        self._save(size, maps)
+                    self._maps[size] = maps
+        return maps
+
+    def rectify(self, left_img, right_img, interpolation=cv2.INTER_LINEAR):
+        (l1, l2), (r1, r2) = self.maps((left_img.shape[1], left_img.shape[0]))
+        if right_img.shape[:2] != left_img.shape[:2]:
+            (_, _), (r1, r2) = self.maps((right_img.shape[1], right_img.shape[0]))
+        return (cv2.remap(left_img, l1, l2, interpolation),
+                cv2.remap(right_img, r1, r2, interpolation))
+
+    def _cache_path(self, size):
+        return os.path.join(self.cache_dir, f"{self.key}_{size[0]}x{size[1]}.npz")
+
+    def _build(self, size):
+        camL, distL, rectL, projL = self.left_params
+        camR, distR, rectR, projR = self.right_params
+        left = cv2.initUndistortRectifyMap(camL, distL, rectL, projL, size, cv2.CV_16SC2)
+        right = cv2.initUndistortRectifyMap(camR, distR, rectR, projR, size, cv2.CV_16SC2)
+        return left, right
+
+    def _load(self, size):
+        path = self._cache_path(size)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as z:
+                return (z['l1'], z['l2']), (z['r1'], z['r2'])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[Rectify] ȡʧܣ: {path}: {e}")
+            return None
+
+    def _save(self, size, maps):
+        (l1, l2), (r1, r2) = maps
+        path = self._cache_path(size)
+        tmp = path + '.tmp.npz'
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.savez(tmp, l1=l1, l2=l2, r1=r1, r2=r2)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[Rectify] дʧ: {path}: {e}")
+
+
+_rectifiers = {}
+_rectifiers_lock = threading.Lock()
+
+
+def get_rectifier(left_yaml, right_yaml):
+    """ͬһԱ궨ļڽֻһ StereoRectifier"""
+    key = (os.path.abspath(left_yaml), os.path.abspath(right_yaml))
+    with _rectifiers_lock:
+        rectifier = _rectifiers.get(key)
+        if rectifier is None:
+            rectifier = _rectifiers[key] = StereoRectifier(left_yaml, right_yaml)
+        return rectifier
@@ -0,0 +1,463 @@
+# -*- coding: gbk -*-
+"""طͶˣֽն˵Эط¼ݻϳݣѹ
+
+    python stream_replay.py image  --port 5001 --fps 30 --width 1280 --height 720 --image-every 100
+    python stream_replay.py stereo --port 5002 --fps 30 --width 2560 --height 720
+    python stream_replay.py stereo --stereo-version 1            # ɵ 0x01 ֡ʽ
+    python stream_replay.py stereo --drop-every 50               # ÿ 50 ֡һ֡鶪֡ͳ
+    python stream_replay.py stereo --preview-scale 4             # ֻ 1/4 ԤӦȫֱ֡
+    python stream_replay.py voice  --port 5001 --rate 44100 --block 1024 --upload-every 10
+    python stream_replay.py image  --source received_data/video/<¼Ŀ¼> --receiver-pid 1234
+
+--source  jpg ͼƬĿ¼mjpeg_record ¼Ŀ¼ƵЭ飩 wav ļƵЭ飩
+ÿһʵ fpsʡʱӺͽն CPU ռá
+
+ʱӰ TCP ȷϼ㣺¼ÿ֡ʼ͵ʱ䣬ȵ֡һֽڱԶȷ
+Linux ϷͶ SIOCOUTQ δȷֽ֮֡ǰΪֹն˴ʱ
+մսȷϱʱӻ֮ Linux ƽ̨ͳʱӡ
+
+stereo ЭĬϷʹźͲɼʱ 0x02 ֡ stereo_protocolӦն˵Ķʱ
+--preview-scale ʱķ 0x03 Ԥ֡ն˰ʱٰӦȫֱ֡
+"""
+import argparse
+import collections
+import glob
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+import cv2
+
+from mjpeg_record import MjpegRecording, segment_paths
+import stereo_protocol as proto
+
+IMAGE_DELIM = b'|PROTOCOL_SWITCH|'
+
+try:
+    import fcntl
+    import termios
+    SIOCOUTQ = termios.TIOCOUTQ  # Linux ׽ֵ SIOCOUTQ  TIOCOUTQ ȡֵͬ
+except ImportError:
+    fcntl = None
+
+
+# ---------- Դ ----------
+def synthetic_frames(width, height, count=30, quality=90):
+    """Ԥȱһ֡ŵĽͼѭﲻ"""
+    frames = []
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    for i in range(count):
+        img = np.empty((height, width, 3), np.uint8)
+        img[..., 0] = (x + i * 8) % 256
+        img[..., 1] = (y + i * 4) % 256
+        img[..., 2] = ((x + y) / 2 + i * 2) % 256
+        cv2.putText(img, f"#{i}", (20, 60), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        ok, enc = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        frames.append(enc.tobytes())
+    return frames
+
+
+def load_frames(source, width, height):
+    """ȡ¼Ƶ JPEG ֡¼Ŀ¼ jpg Ŀ¼δ source ʱʹúϳ֡"""
+    if source is None:
+        return synthetic_frames(width, height)
+    if os.path.exists(segment_paths(source, 0)[1]):
+        rec = MjpegRecording(source)
+        return [jpeg for _, jpeg in rec.iter_frames()]
+
+    frames = []
+    for path in sorted(glob.glob(os.path.join(source, '*.jpg'))):
+        with open(path, 'rb') as f:
+            frames.append(f.read())
+    if not frames:
+        raise ValueError(f"{source} ûпɻطŵ JPEG ֡")
+    return frames
+
+
+def load_pcm(source, rate, seconds=5.0):
+    """ȡ 16 λ wav Ϊ float32δ source ʱ + """
+    if source is None:
+        t = np.arange(int(rate * seconds), dtype=np.float32) / rate
+        tone = 0.3 * np.sin(2 * np.pi * 440 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 0.5 * t))
+        noise = 0.02 * np.random.default_rng(0).standard_normal(len(t)).astype(np.float32)
+        return rate, (tone + noise).astype(np.float32)
+
+    with wave.open(source, 'rb') as w:
+        if w.getsampwidth() != 2:
+            raise ValueError("ֻ֧ 16 λ wav")
+        data = np.frombuffer(w.readframes(w.getnframes()), np.int16)
+        data = data.reshape(-1, w.getnchannels())[:, 0]
+        return w.getframerate(), data.astype(np.float32) / 32768.0
+
+
+def wav_bytes(pcm, rate):
+    import io
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes((np.clip(pcm, -1, 1) * 32767).astype(np.int16).tobytes())
+    return buf.getvalue()
+
+
+# ---------- Э ----------
+def image_video_frame(jpeg):
+    return struct.pack('>L', len(jpeg)) + jpeg
+
+
+def image_command(jpeg, cmd=b'image'):
+    return (IMAGE_DELIM + b'\x00' + struct.pack('>L', len(cmd)) + cmd + IMAGE_DELIM
+            + struct.pack('>L', len(jpeg)) + jpeg)
+
+
+def stereo_frame(jpeg):
+    return proto.jpeg_frame(jpeg)
+
+
+def stereo_frame_v2_builder(drop_every=0, previews=None):
+    """֡ŵ 0x02 ֡캯drop_every > 0 ʱÿ N ֡ Noneͣ
+
+     previews ʱķ 0x03 Ԥ֡video_messages  0, 1, 2 ... ˳ȡ֡
+     n Ӧ frames[n % len(frames)]Ӧȫֱʱݴ˲ҡ
+    """
+    seq = [0]
+
+    def build(jpeg):
+        n = seq[0]
+        seq[0] += 1
+        if drop_every and n % drop_every == drop_every - 1:
+            return None
+        if previews is not None:
+            small, full_size = previews[n % len(previews)]
+            return proto.preview_frame(small, n, full_size)
+        return proto.jpeg_frame_v2(jpeg, n)
+
+    return build
+
+
+def make_previews(frames, scale, quality=80):
+    """ȫֱ JPEG С scale ±룬ΪԤ [(Ԥ JPEG, ȫֱ (, )), ...]"""
+    previews = []
+    for jpeg in frames:
+        img = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        small = cv2.resize(img, (img.shape[1] // scale, img.shape[0] // scale), interpolation=cv2.INTER_AREA)
+        small_jpeg = cv2.imencode('.jpg', small, [int(cv2.IMWRITE_JPEG_QUALITY), quality])[1].tobytes()
+        previews.append((small_jpeg, (img.shape[1], img.shape[0])))
+    return previews
+
+
+def voice_pcm(pcm):
+    data = pcm.astype(np.float32).tobytes()
+    return struct.pack('>I', len(data)) + data
+
+
+def voice_upload(wav):
+    return struct.pack('>I', 0) + struct.pack('>I', len(wav)) + wav
+
+
+# ---------- ͳ ----------
+class AckLatencyProbe:
+    """ TCP ȷϲÿϢķ͵ȷʱӣ Linux"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.enabled = fcntl is not None
+        self.sent = 0
+        self.pending = collections.deque()
+        self.samples = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if self.enabled:
+            threading.Thread(target=self._poll, daemon=True).start()
+
+    def mark(self, nbytes, t_start):
+        with self._lock:
+            self.sent += nbytes
+            self.pending.append((self.sent, t_start))
+
+    def skip(self, nbytes):
+        """˲ʱӵֽڣʱӦ𣩣ֻѷ"""
+        with self._lock:
+            self.sent += nbytes
+
+    def take_samples(self):
+        with self._lock:
+            samples, self.samples = self.samples, []
+        return samples
+
+    def close(self):
+        self._stop.set()
+
+    def _unacked(self):
+        buf = fcntl.ioctl(self.sock.fileno(), SIOCOUTQ, b'\x00\x00\x00\x00')
+        return struct.unpack('i', buf)[0]
+
+    def _poll(self):
+        while not self._stop.is_set():
+            try:
+                unacked = self._unacked()
+            except OSError:
+                break
+            now = time.perf_counter()
+            with self._lock:
+                acked = self.sent - unacked
+                while self.pending and self.pending[0][0] <= acked:
+                    self.samples.append(now - self.pending.popleft()[1])
+            time.sleep(0.0005)
+
+
+class ProcessCpu:
+    """ȡ /proc/<pid>/stat ն CPU ռã˰ٷֱȣ"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.tick = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self._last = self._read()
+
+    def _read(self):
+        if self.pid is None:
+            return None
+        try:
+            with open(f'/proc/{self.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            return None
+        return (int(fields[11]) + int(fields[12])) / self.tick, time.perf_counter()
+
+    def percent(self):
+        now = self._read()
+        if now is None or self._last is None:
+            return None
+        used = now[0] - self._last[0]
+        elapsed = now[1] - self._last[1]
+        self._last = now
+        return 100.0 * used / elapsed if elapsed > 0 else None
+
+
+class Reporter:
+    def __init__(self, name, probe, cpu, unit='fps'):
+        self.name = name
+        self.probe = probe
+        self.cpu = cpu
+        self.unit = unit
+        self.start = self.last = time.perf_counter()
+        self.count = self.total_count = 0
+        self.nbytes = self.total_bytes = 0
+        self.latencies = []
+
+    def add(self, nbytes, count=1):
+        self.count += count
+        self.nbytes += nbytes
+        now = time.perf_counter()
+        if now - self.last >= 1.0:
+            self.report(now)
+
+    def report(self, now, final=False):
+        elapsed = now - (self.start if final else self.last)
+        count = self.total_count + self.count if final else self.count
+        nbytes = self.total_bytes + self.nbytes if final else self.nbytes
+        samples = self.probe.take_samples()
+        self.latencies.extend(samples)
+        if final:
+            samples = self.latencies
+
+        parts = [f"[Replay] {self.name}",
+                 f"{count / elapsed:.1f} {self.unit}",
+                 f"{nbytes / elapsed / (1024 * 1024):.2f} MB/s"]
+        if samples:
+            parts.append(f"ʱ p50 {np.percentile(samples, 50) * 1000:.1f} ms"
+                         f" p95 {np.percentile(samples, 95) * 1000:.1f} ms")
+        cpu = self.cpu.percent()
+        if cpu is not None:
+            parts.append(f"ն CPU {cpu:.0f}%")
+        if final:
+            parts.insert(1, f" {count}  {nbytes / (1024 * 1024):.1f} MB ʱ {elapsed:.1f} s")
+        print('  '.join(parts))
+
+        if not final:
+            self.total_count += self.count
+            self.total_bytes += self.nbytes
+            self.count = self.nbytes = 0
+            self.last = now
+
+
+# ---------- ѭ ----------
+class ControlResponder:
+    """ȡն˷Ķʱȫֱ֡Ӧ뷢ѭ send_lockϢ
+
+    full_frame(seq) ظŵȫֱ JPEGԤʱΪ None
+    """
+
+    def __init__(self, sock, send_lock, probe, full_frame=None):
+        self.sock = sock
+        self.send_lock = send_lock
+        self.probe = probe
+        self.full_frame = full_frame
+        self.pongs = 0
+        self.full_sent = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _reply(self, message):
+        with self.send_lock:
+            self.sock.sendall(message)
+            self.probe.skip(len(message))
+
+    def _run(self):
+        buf = b''
+        try:
+            while True:
+                data = self.sock.recv(4096)
+                if not data:
+                    break
+                buf += data
+                while len(buf) >= 5:
+                    length = struct.unpack('>L', buf[:4])[0]
+                    if len(buf) < 4 + length:
+                        break
+                    frame_type, payload = buf[4], buf[5:4 + length]
+                    buf = buf[4 + length:]
+                    if frame_type == proto.CLOCK_PING:
+                        self._reply(proto.pong(payload))
+                        self.pongs += 1
+                    elif frame_type == proto.FULL_REQUEST:
+                        seq, = proto.REQUEST.unpack_from(payload)
+                        jpeg = self.full_frame(seq) if self.full_frame is not None else None
+                        self._reply(proto.full_response(jpeg, seq))
+                        self.full_sent += 1
+                        print(f"[Replay] Ӧȫֱ֡ {seq}")
+        except OSError:
+            pass
+
+
+def paced_send(sock, messages, interval, duration, reporter, probe, send_lock=None):
+    """̶ messages Ϣinterval Ϊ 0 ʱ췢
+
+    Ŵ messages ȡһɼʱϢڷǰһ̲Ŵʱ
+    ȡ None ʾһ
+    """
+    send_lock = send_lock or threading.Lock()
+    messages = iter(messages)
+    deadline = time.perf_counter()
+    end = deadline + duration if duration > 0 else None
+    while True:
+        now = time.perf_counter()
+        if end is not None and now >= end:
+            break
+        if interval > 0:
+            if deadline > now:
+                time.sleep(deadline - now)
+            deadline += interval
+
+        message = next(messages, False)
+        if message is False:
+            break
+        if message is None:
+            continue
+        with send_lock:
+            t_start = time.perf_counter()
+            sock.sendall(message)
+            probe.mark(len(message), t_start)
+        reporter.add(len(message))
+
+
+def video_messages(frames, build, image_every=0):
+    i = 0
+    while True:
+        jpeg = frames[i % len(frames)]
+        if image_every and i % image_every == image_every - 1:
+            yield image_command(jpeg)
+        else:
+            yield build(jpeg)
+        i += 1
+
+
+def voice_messages(pcm, rate, block, upload_every):
+    upload = wav_bytes(pcm[:rate], rate) if upload_every > 0 else None
+    blocks_per_upload = int(upload_every * rate / block) if upload_every > 0 else 0
+    i = 0
+    pos = 0
+    while True:
+        if blocks_per_upload and i % blocks_per_upload == blocks_per_upload - 1:
+            yield voice_upload(upload)
+        else:
+            chunk = pcm[pos:pos + block]
+            if len(chunk) < block:
+                chunk = np.concatenate([chunk, pcm[:block - len(chunk)]])
+            pos = (pos + block) % len(pcm)
+            yield voice_pcm(chunk)
+        i += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="նЭط / ѹ⹤")
+    parser.add_argument('protocol', choices=['image', 'stereo', 'voice'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None, help="Ĭ image/voice 5001stereo 5002")
+    parser.add_argument('--source', default=None, help="¼ݣjpg Ŀ¼¼Ŀ¼ wav ļ")
+    parser.add_argument('--fps', type=float, default=30, help="Ƶ֡ʣ0 ʾ췢")
+    parser.add_argument('--width', type=int, default=None, help="ϳ֡")
+    parser.add_argument('--height', type=int, default=720, help="ϳ֡߶")
+    parser.add_argument('--image-every', type=int, default=0, help="image Эÿ N ֡һͼ")
+    parser.add_argument('--rate', type=int, default=44100, help="ϳƵ")
+    parser.add_argument('--block', type=int, default=1024, help="ÿƵĲ")
+    parser.add_argument('--upload-every', type=float, default=0, help="ÿ N 뷢һ wav ϴ")
+    parser.add_argument('--duration', type=float, default=0, help="0 ʾһֱ")
+    parser.add_argument('--receiver-pid', type=int, default=None, help="ն˽̺ţͳ CPU")
+    parser.add_argument('--stereo-version', type=int, choices=[1, 2], default=2,
+                        help="stereo ֡ʽ1 Ϊɵ 0x012 ΪźͲɼʱ 0x02")
+    parser.add_argument('--drop-every', type=int, default=0, help="stereo v2 ÿ N ֡һ֡ڼ鶪֡ͳ")
+    parser.add_argument('--preview-scale', type=int, default=0,
+                        help="stereo v2 ֻС N Ԥȫֱ֡նͣ0 ʾر")
+    args = parser.parse_args()
+
+    port = args.port or (5002 if args.protocol == 'stereo' else 5001)
+    sock = socket.create_connection((args.host, port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    probe = AckLatencyProbe(sock)
+    cpu = ProcessCpu(args.receiver_pid)
+    print(f"[Replay]  {args.host}:{port}Э {args.protocol}")
+
+    reporter = None
+    try:
+        if args.protocol == 'voice':
+            rate, pcm = load_pcm(args.source, args.rate)
+            reporter = Reporter('voice', probe, cpu, unit='/s')
+            messages = voice_messages(pcm, rate, args.block, args.upload_every)
+            paced_send(sock, messages, args.block / rate, args.duration, reporter, probe)
+        else:
+            width = args.width or (2560 if args.protocol == 'stereo' else 1280)
+            frames = load_frames(args.source, width, args.height)
+            send_lock = threading.Lock()
+            if args.protocol == 'stereo' and args.stereo_version == 2:
+                previews = make_previews(frames, args.preview_scale) if args.preview_scale > 1 else None
+                build = stereo_frame_v2_builder(args.drop_every, previews)
+                full_frame = (lambda seq: frames[seq % len(frames)]) if previews is not None else None
+                ControlResponder(sock, send_lock, probe, full_frame)
+            else:
+                build = stereo_frame if args.protocol == 'stereo' else image_video_frame
+            image_every = args.image_every if args.protocol == 'image' else 0
+            reporter = Reporter(args.protocol, probe, cpu)
+            interval = 1.0 / args.fps if args.fps > 0 else 0
+            paced_send(sock, video_messages(frames, build, image_every), interval, args.duration, reporter, probe,
+                       send_lock)
+    except KeyboardInterrupt:
+        pass
+    except (BrokenPipeError, ConnectionResetError):
+        print("[Replay] ն˶Ͽ")
+    finally:
+        time.sleep(0.2)
+        if reporter is not None:
+            reporter.report(time.perf_counter(), final=True)
+        probe.close()
+        sock.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
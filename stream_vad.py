@@ -0,0 +1,219 @@
+# -*- coding: gbk -*-
+"""ʵʱƵԶж
+
+߳ submit() յ PCM ̰߳ FRAME_MS ֡һζһ֡ؼ
+ͨ֡׵ӦױȽϵõÿ֡Ƿ
+ MIN_SPEECH_MS ʼһΣ HANGOVER_MS һΡ
+ÿǰ PAD_MSд 16 λ wav  AsyncWriter ̣Ĭ received_data/cuts
+ļֹиƬηһ𣬿ֱ voice_detect.py
+
+̶߳ڲţֻÿνʱ HANGOVER_MS + PAD_MS
+cpu_per_second() ÿƵĵ CPU ʱ䡣
+"""
+import collections
+import io
+import os
+import queue
+import threading
+import time
+import wave
+
+import numpy as np
+
+from async_writer import AsyncWriter, unique_path
+
+FRAME_MS = 20
+ENERGY_MARGIN_DB = 9.0  # ߳ô༴Ϊ
+FLUX_MARGIN_DB = 4.0  # ֻ߳ôʱͨھֵ FLUX_FACTOR 
+FLUX_FACTOR = 2.0
+NOISE_ADAPT = 0.02  # ֡׵ٶ
+MIN_SPEECH_MS = 100
+HANGOVER_MS = 300
+PAD_MS = 300
+MIN_CLIP_MS = 400  # ڴ˵Ƭζ
+MAX_CLIP_SECONDS = 30  # ˳ǿж
+QUEUE_PACKETS = 512
+
+
+def wav_bytes(pcm, rate):
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes((np.clip(pcm, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+    return buf.getvalue()
+
+
+class StreamVad:
+    """ float32 жsubmit() ߳е"""
+
+    def __init__(self, rate, out_dir='received_data/cuts', prefix='vad_'):
+        self.rate = rate
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.frame = int(rate * FRAME_MS / 1000)
+        self.window = np.hanning(self.frame).astype(np.float32)
+        self.clips = 0
+        self.dropped = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+        self._min_speech = max(1, MIN_SPEECH_MS // FRAME_MS)
+        self._hangover = max(1, HANGOVER_MS // FRAME_MS)
+        self._pad = int(rate * PAD_MS / 1000)
+        self._max_clip = int(rate * MAX_CLIP_SECONDS)
+
+        # ״ֻ̬ڼ߳зʣ
+        self._pending = np.empty(0, np.float32)  # һ֡β
+        self._next_frame = 0  # һ֡׸ľ
+        self._prev_mag = None
+        self._noise_db = None
+        self._noise_flux = None
+        self._speech_run = 0
+        self._silence_run = 0
+        self._start = None  # ǰ׸ľ
+        self._end = None  # ǰһ֮ţȴβ
+        self._continued = False  # ǰνǿж֮󣬲ٲͷһص
+        self._history = collections.deque()  # (, ) İ
+        self._history_start = 0
+        self._history_end = 0
+
+        self._cpu = 0.0
+        self._audio = 0
+        self._stats_lock = threading.Lock()
+        self._writer = AsyncWriter('VAD д', max_queue=16)
+        self._queue = queue.Queue(maxsize=QUEUE_PACKETS)
+        self._thread = threading.Thread(target=self._run, name='stream-vad', daemon=True)
+        self._thread.start()
+
+    def submit(self, pcm):
+        """һƣʱ߳"""
+        try:
+            self._queue.put_nowait(pcm)
+        except queue.Full:
+            self.dropped += len(pcm)
+
+    def cpu_per_second(self):
+        """ (CPU  / Ƶ, ͳƵƵ)ͳƴ"""
+        with self._stats_lock:
+            cpu, audio = self._cpu, self._audio
+            self._cpu, self._audio = 0.0, 0
+        seconds = audio / self.rate
+        return (cpu / seconds if seconds else 0.0), seconds
+
+    def report(self):
+        ratio, seconds = self.cpu_per_second()
+        return (f"VAD  {self.clips} ΣCPU {ratio * 1000:.2f} ms/Ƶ"
+                f"{seconds:.1f} s Ƶ {self.dropped} ")
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._writer.close()
+
+    def _run(self):
+        while True:
+            pcm = self._queue.get()
+            if pcm is None:
+                break
+            t0 = time.thread_time()
+            self._process(pcm)
+            with self._stats_lock:
+                self._cpu += time.thread_time() - t0
+                self._audio += len(pcm)
+        if self._start is not None:
+            self._emit(self._history_end)
+
+    def _process(self, pcm):
+        self._history.append((self._history_end, pcm))
+        self._history_end += len(pcm)
+
+        data = np.concatenate([self._pending, pcm]) if len(self._pending) else pcm
+        count = len(data) // self.frame
+        self._pending = data[count * self.frame:].copy()
+        if count:
+            speech = self._classify(data[:count * self.frame].reshape(count, self.frame))
+            for is_speech in speech:
+                self._step(bool(is_speech))
+                self._next_frame += self.frame
+
+        # β˾дǿж
+        if self._end is not None and self._history_end >= self._end + self._pad:
+            self._emit(self._end + self._pad)
+        elif self._start is not None and self._end is None and self._history_end - self._start >= self._max_clip:
+            self._emit(self._history_end)
+            self._start = self._history_end
+            self._continued = True
+        self._trim_history()
+
+    def _classify(self, frames):
+        """һ֡ͨÿ֡Ƿ"""
+        energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        mag = np.abs(np.fft.rfft(frames * self.window, axis=1))
+        prev = self._prev_mag if self._prev_mag is not None else mag[0]
+        diff = np.diff(np.vstack([prev[None, :], mag]), axis=0)
+        flux = np.sum(np.maximum(diff, 0), axis=1) / (np.sum(mag, axis=1) + 1e-10)
+        self._prev_mag = mag[-1]
+
+        if self._noise_db is None:
+            self._noise_db = float(energy_db[0])
+            self._noise_flux = float(flux[0])
+
+        speech = np.empty(len(frames), dtype=bool)
+        for i in range(len(frames)):
+            above = energy_db[i] - self._noise_db
+            speech[i] = above > ENERGY_MARGIN_DB or (
+                above > FLUX_MARGIN_DB and flux[i] > FLUX_FACTOR * self._noise_flux)
+            # ֡µ֡ٻ
+            if energy_db[i] < self._noise_db:
+                self._noise_db = float(energy_db[i])
+            elif not speech[i]:
+                self._noise_db += (energy_db[i] - self._noise_db) * NOISE_ADAPT
+            if not speech[i]:
+                self._noise_flux += (flux[i] - self._noise_flux) * NOISE_ADAPT
+        return speech
+
+    def _step(self, is_speech):
+        if is_speech:
+            self._speech_run += 1
+            self._silence_run = 0
+            if self._end is not None:
+                # βڼֳͬһ
+                self._end = None
+            if self._start is None and self._speech_run >= self._min_speech:
+                self._start = self._next_frame - (self._speech_run - 1) * self.frame
+        else:
+            self._speech_run = 0
+            if self._start is not None and self._end is None:
+                self._silence_run += 1
+                if self._silence_run >= self._hangover:
+                    self._end = self._next_frame - (self._silence_run - 1) * self.frame
+
+    def _emit(self, end):
+        start = self._start if self._continued else max(self._start - self._pad, self._history_start)
+        end = min(end, self._history_end)
+        self._start = None
+        self._end = None
+        self._continued = False
+        if end - start < self.rate * MIN_CLIP_MS / 1000:
+            return
+        parts = []
+        for base, pcm in self._history:
+            lo, hi = max(start, base), min(end, base + len(pcm))
+            if lo < hi:
+                parts.append(pcm[lo - base:hi - base])
+        path = unique_path(self.out_dir, self.prefix, '.wav')
+        self._writer.submit(path, wav_bytes(np.concatenate(parts), self.rate), self._saved)
+        self.clips += 1
+
+    @staticmethod
+    def _saved(path, ok):
+        if ok:
+            print(f"[VAD] ѱƬΣ{path}")
+
+    def _trim_history(self):
+        # ûнеĶʱֻͷ PAD_MS
+        keep_from = self._history_end - self._pad if self._start is None else self._start - self._pad
+        while self._history and self._history[0][0] + len(self._history[0][1]) <= keep_from:
+            base, pcm = self._history.popleft()
+            self._history_start = base + len(pcm)
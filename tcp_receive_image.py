@@ -1,34 +1,238 @@
 # -*- coding: gbk -*-
+import argparse
+import asyncio
 import socket
 import struct
 import os
 import threading
 import queue
+import time
+from datetime import datetime
 import numpy as np
 import cv2
 from concurrent.futures import ThreadPoolExecutor
+from recv_ring import RecvRing
+from async_writer import AsyncWriter, unique_path
+from mjpeg_record import MjpegRecorder
+import metrics
 
 # ----------  ----------
 SERVER_IP = '0.0.0.0'
 PORT = 5001
 SAVE_DIR = 'received_data/image'
-BUFFER_SIZE = 4096
+BUFFER_SIZE = 256 * 1024  #  recv_into ȡ
+RING_CAPACITY = 16 * 1024 * 1024  # ջʼһĴͼϢ
+SOCKET_RCVBUF = 4 * 1024 * 1024  # ں˽ջС0 ʾʹϵͳĬ
+DECODE_WORKERS = 2  # ÿӵƵ֡߳
+DECODE_QUEUE_SIZE = 4  # г
+DECODE_QUEUE_POLICY = 'drop-oldest'  # ʱ'drop-oldest' ɣ'drop-newest' ֡'block' 
+METRICS_PORT = 9101  # ָ˵˿ڣ RECEIVER_METRICS=1 Ż
+SERVER_MODE = 'async'  # 'async'asyncio ӣ'single'ӣϿ˳ --mode ǣ
 MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MBͼƬС
+RECORD_VIDEO = False  # ǷƵԭʼ JPEG ֡¼ֶ¼񣨼 mjpeg_record.py
+RECORD_DIR = 'received_data/video'
+SAVE_MODE = 'passthrough'  # 'passthrough'У JPEG Ǻԭд̣'reencode' 95 ±
 
 DELIM = b'|PROTOCOL_SWITCH|'  # Эָ
-os.makedirs(SAVE_DIR, exist_ok=True)
 
 # ---------- ߳ ----------
-frame_queue = queue.Queue(maxsize=100)
 executor = ThreadPoolExecutor(max_workers=2)
+image_writer = AsyncWriter('[Server] ͼд')
+display_stop = threading.Event()
+
+# ---------- ָ ----------
+M_RECV_BYTES = metrics.counter('image_recv_bytes_total', 'ֽ')
+M_PARSE = metrics.histogram('image_parse_seconds', 'ÿ recv ʱ')
+M_DECODE = metrics.histogram('image_decode_seconds', '֡Ƶʱ')
+M_FRAMES = metrics.counter('image_frames_total', 'յƵ֡')
+M_DROPPED = metrics.counter('image_frames_dropped_total', 'ٵƵ֡')
+M_SAVE = metrics.histogram('image_save_seconds', 'ͼյдɵĺʱ')
+M_SAVE_DROPPED = metrics.counter('image_save_dropped_total', 'д̶Ĵͼ')
+M_RECORD_DROPPED = metrics.counter('image_record_dropped_total', 'д̶δ¼Ƶ֡')
+
+
+# ---------- Ƶ֡ ----------
+class LatestFrame:
+    """ʾֻۣһ֡ٵľֱ֡Ӷ"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = -1
+        self._frame = None
+        self.stale_dropped = 0
+
+    def publish(self, seq, frame):
+        with self._lock:
+            if seq <= self._seq:
+                self.stale_dropped += 1
+                return False
+            self._seq = seq
+            self._frame = frame
+            return True
+
+    def newer_than(self, seq):
+        """б seq µ֡ʱ (seq, frame)򷵻 None"""
+        with self._lock:
+            if self._seq <= seq:
+                return None
+            return self._seq, self._frame
+
+
+class DecodePool:
+    """Ƶ̳֡߳أsocket ֻ߳ӣдʾ"""
+
+    def __init__(self, slot, workers=DECODE_WORKERS, maxsize=DECODE_QUEUE_SIZE, policy=DECODE_QUEUE_POLICY):
+        if policy not in ('drop-oldest', 'drop-newest', 'block'):
+            raise ValueError(f"δ֪Ķв: {policy}")
+        self.slot = slot
+        self.policy = policy
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.submitted = 0
+        self.decoded = 0
+        self.queue_dropped = 0
+        self.decode_failed = 0
+        self._seq = 0
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, chunk):
+        """ύһ֡ JPEGchunk ǽջ memoryviewǰḴƳ"""
+        self.submitted += 1
+        M_FRAMES.inc()
+        seq = self._seq
+        self._seq += 1
+
+        if self.policy == 'block':
+            self.queue.put((seq, bytes(chunk)))
+            return
+        if self.policy == 'drop-newest' and self.queue.full():
+            self.queue_dropped += 1
+            M_DROPPED.inc()
+            return
+
+        item = (seq, bytes(chunk))
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                if self.policy == 'drop-newest':
+                    self.queue_dropped += 1
+                    M_DROPPED.inc()
+                    return
+                try:
+                    self.queue.get_nowait()
+                    self.queue_dropped += 1
+                    M_DROPPED.inc()
+                except queue.Empty:
+                    pass
+
+    def stats(self):
+        return {
+            'submitted': self.submitted,
+            'decoded': self.decoded,
+            'queue_dropped': self.queue_dropped,
+            'stale_dropped': self.slot.stale_dropped,
+            'decode_failed': self.decode_failed,
+            'queue_depth': self.queue.qsize(),
+        }
+
+    def close(self):
+        for _ in self._threads:
+            self.queue.put(None)
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            seq, data = item
+            t0 = time.perf_counter()
+            try:
+                frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            except Exception as e:
+                print(f"[Server] Ƶ֡쳣: {e}")
+                frame = None
+            M_DECODE.observe(time.perf_counter() - t0)
+            if frame is None:
+                self.decode_failed += 1
+                continue
+            self.decoded += 1
+            if not self.slot.publish(seq, frame):
+                M_DROPPED.inc()
+
+
+# ---------- ״̬ ----------
+class ClientSession:
+    """ͶӵĽ״̬ȥ򣺶ʾڡ̺߳ʹͼĿ¼"""
+
+    def __init__(self, name, save_dir=SAVE_DIR, window_name=None):
+        self.name = name
+        self.save_dir = save_dir
+        self.window_name = window_name or f'Server Stream - {name}'
+        self.latest = LatestFrame()
+        self.decoder = DecodePool(self.latest)
+        self.image_counter = 1
+        self.closed = False
+        self.recorder = None
+        os.makedirs(save_dir, exist_ok=True)
+
+    def start_recording(self, root=RECORD_DIR):
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        directory = os.path.join(root, f"{self.name.replace(':', '_')}_{stamp}")
+        self.recorder = MjpegRecorder(directory)
+        print(f"[Server] ʼ¼: {directory}")
+
+
+# ʾĻỰʾ߳ѯ
+sessions = {}
+sessions_lock = threading.Lock()
+
+
+def decode_queue_depth():
+    with sessions_lock:
+        return sum(s.decoder.queue.qsize() for s in sessions.values())
+
+
+M_QUEUE_DEPTH = metrics.gauge('image_decode_queue_depth', 'ӴƵ֡', decode_queue_depth)
 
-# ---------- ȫ״̬ ----------
-image_counter = 1
+
+def register_session(session):
+    if RECORD_VIDEO and session.recorder is None:
+        session.start_recording()
+    with sessions_lock:
+        sessions[session.name] = session
+
+
+def close_session(session):
+    """Ựкд̶ʱ첽ģʽ·ŵ߳"""
+    session.closed = True
+    session.decoder.close()
+    print(f"[Server] {session.name} ͳ: {session.decoder.stats()}")
+    if session.recorder is not None:
+        # ύ֮֡رգܶ
+        image_writer.submit_call(lambda recorder=session.recorder: finish_recording(recorder))
+        session.recorder = None
+
+
+def finish_recording(recorder):
+    recorder.close()
+    print(f"[Server] ¼: {recorder.directory} {recorder.frames} ֡")
+
+
+def record_frame(session, chunk, timestamp):
+    """һ֡д߳׷ӵ¼chunk ָջȸ"""
+    recorder = session.recorder
+    data = bytes(chunk)
+    if not image_writer.submit_call(lambda: recorder.append(data, timestamp), block=False):
+        M_RECORD_DROPPED.inc()
 
 
 # ---------- ̨ ----------
-def save_large_image(data, idx):
+def save_large_image(data, idx, save_dir=SAVE_DIR):
     """ȫͼĺ̨"""
+    t0 = time.perf_counter()
     try:
         if len(data) > MAX_IMAGE_SIZE:
             print(f"[Server] ͼƬ({len(data)} bytes)Ѷ")
@@ -40,30 +244,103 @@ def save_large_image(data, idx):
             print("[Server] ͼƬʧ")
             return
 
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        path = os.path.join(SAVE_DIR, f"{timestamp}.jpg")
-
+        path = unique_path(save_dir)
         if not cv2.imwrite(path, img, [int(cv2.IMWRITE_JPEG_QUALITY), 95]):
             print(f"[Server] ͼƬʧ: {path}")
             return
 
+        M_SAVE.observe(time.perf_counter() - t0)
         print(f"[Server] ͼɹ: {path}")
+        notify_image_consumers(ReceivedImage(path, data, img))
     except Exception as e:
         print(f"[Server] ͼ쳣: {e}")
 
 
+# ---------- ԭ ----------
+class ReceivedImage:
+    """ѱĴͼԭʼ JPEG ֽڣڵһε pixels() ʱŽ"""
+
+    def __init__(self, path, data, pixels=None):
+        self.path = path
+        self.data = data
+        self._pixels = pixels
+
+    def pixels(self):
+        if self._pixels is None:
+            self._pixels = cv2.imdecode(np.frombuffer(self.data, np.uint8), cv2.IMREAD_COLOR)
+        return self._pixels
+
+
+# Ҫ´ͼĻصǩΪ consumer(ReceivedImage)д߳е
+image_consumers = []
+
+
+def notify_image_consumers(image):
+    for consumer in image_consumers:
+        try:
+            consumer(image)
+        except Exception as e:
+            print(f"[Server] ͼص쳣: {e}")
+
+
+def is_valid_jpeg(data):
+    """ֻ SOI  EOI ǣ룻EOI ֽ֮"""
+    if len(data) < 4 or data[:3] != b'\xff\xd8\xff':
+        return False
+    return b'\xff\xd9' in bytes(data[-16:])
+
+
+def store_raw_image(data, save_dir=SAVE_DIR):
+    """Уԭʼ JPEG ֽڽд̣߳Ҳ±"""
+    if not is_valid_jpeg(data):
+        print(f"[Server] ͼƬ JPEG({len(data)} bytes)Ѷ")
+        return
+
+    t0 = time.perf_counter()
+
+    def on_done(path, ok):
+        if ok:
+            M_SAVE.observe(time.perf_counter() - t0)
+            print(f"[Server] ͼɹ: {path}")
+            notify_image_consumers(ReceivedImage(path, data))
+
+    # ¼ѭУд̸ʱͼӵĽ
+    path = unique_path(save_dir)
+    if not image_writer.submit(path, data, on_done, block=False):
+        M_SAVE_DROPPED.inc()
+        print(f"[Server] д̶ͼ: {path}")
+
+
 
 def display_worker():
-    """̣߳չʾƵ"""
-    while True:
-        frame = frame_queue.get()
-        if frame is None:  # յֹź
-            break
+    """̣߳չʾƵÿһ"""
+    shown = set()
+    shown_seq = {}
+    while not display_stop.is_set():
+        with sessions_lock:
+            active = list(sessions.values())
 
         try:
-            cv2.imshow('Server Stream', frame)
-            if cv2.waitKey(1) & 0xFF == 27:  # ESC˳
+            for session in active:
+                if session.closed:
+                    with sessions_lock:
+                        if sessions.get(session.name) is session:
+                            del sessions[session.name]
+                    if session.window_name in shown:
+                        cv2.destroyWindow(session.window_name)
+                        shown.discard(session.window_name)
+                    shown_seq.pop(session.name, None)
+                    continue
+
+                # ֻ֡û֡Ͳػ
+                latest = session.latest.newer_than(shown_seq.get(session.name, -1))
+                if latest is None:
+                    continue
+                shown_seq[session.name], frame = latest
+                cv2.imshow(session.window_name, frame)
+                shown.add(session.window_name)
+
+            if cv2.waitKey(1 if shown else 10) & 0xFF == 27:  # ESC˳
                 break
         except Exception as e:
             print(f"[Server] ʾ쳣: {e}")
@@ -73,14 +350,17 @@ def display_worker():
 
 
 # ---------- Ϣ ----------
-def parse_messages(buf):
-    global image_counter
+def parse_messages(buf, session):
+    """ bufbytes / bytearray / memoryviewеϢѵֽ
 
+    ͼƵ֡ buf Ƭʽbuf Ϊ memoryview ʱȫ̲
+    session Ϊӵ״̬ClientSession
+    """
     offset = 0
     n = len(buf)
     while True:
         # ǷǿϢ
-        if buf.startswith(DELIM, offset):
+        if buf[offset:offset + len(DELIM)] == DELIM:
             if n - offset < len(DELIM) + 1 + 4 + len(DELIM):
                 break
 
@@ -91,7 +371,7 @@ def parse_messages(buf):
             if n - offset < txt_len + len(DELIM):
                 break
 
-            cmd = buf[offset:offset + txt_len].decode()
+            cmd = bytes(buf[offset:offset + txt_len]).decode()
             offset += txt_len + len(DELIM)
 
             if cmd == 'image':
@@ -115,8 +395,11 @@ def parse_messages(buf):
                 offset += L
 
                 # ύ̨񱣴ͼ
-                executor.submit(save_large_image, data, image_counter)
-                image_counter += 1
+                if SAVE_MODE == 'passthrough':
+                    store_raw_image(data, session.save_dir)
+                else:
+                    executor.submit(save_large_image, data, session.image_counter, session.save_dir)
+                session.image_counter += 1
                 continue
 
         # Ƶݣ4ֽڳ + JPEG
@@ -131,24 +414,34 @@ def parse_messages(buf):
         chunk = buf[offset:offset + L]
         offset += L
 
-        # Ƶ֡
-        try:
-            arr = np.frombuffer(chunk, np.uint8)
-            frame = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-            if frame is not None:
-                try:
-                    frame_queue.put_nowait(frame)
-                except queue.Full:
-                    pass
-        except Exception as e:
-            print(f"[Server] Ƶ֡쳣: {e}")
+        # ¼ֻ˳׷ӣ벻±룬дļд߳
+        if session.recorder is not None:
+            record_frame(session, chunk, time.time())
+
+        # Ƶ̳֡߳أ socket ߳Ͻ
+        session.decoder.submit(chunk)
 
-    return buf[offset:]
+    return offset
 
 
 # ---------- ѭ ----------
+def receive_into_ring(ring, session):
+    """յݣͼƬ̨סǰ洢"""
+    saved = session.image_counter
+    t0 = time.perf_counter()
+    ring.consume(parse_messages(ring.data(), session))
+    M_PARSE.observe(time.perf_counter() - t0)
+    if session.image_counter != saved:
+        # ͼƬѽ̨棬ٸ洢
+        ring.pin()
+
+
 def run_server():
+    # ģʽֻһỰԭĴͼĿ¼ʹ
+    session = ClientSession('default', SAVE_DIR, 'Server Stream')
+    register_session(session)
     # ʾ߳
+    metrics.serve(METRICS_PORT)
     display_thread = threading.Thread(target=display_worker, daemon=True)
     display_thread.start()
 
@@ -162,14 +455,17 @@ def run_server():
             conn, addr = s.accept()
             print(f"[Server] : {addr}")
 
-            buf = b''
+            if SOCKET_RCVBUF:
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_RCVBUF)
+
+            ring = RecvRing(RING_CAPACITY)
             while True:
                 try:
-                    data = conn.recv(BUFFER_SIZE)
-                    if not data:
+                    n = ring.recv_into(conn, BUFFER_SIZE)
+                    if n == 0:
                         break
-                    buf += data
-                    buf = parse_messages(buf)
+                    M_RECV_BYTES.inc(n)
+                    receive_into_ring(ring, session)
                 except ConnectionResetError:
                     print("[Server] ͻ˶Ͽ")
                     break
@@ -181,11 +477,91 @@ def run_server():
             print("\n[Server] յжź")
         finally:
             # Դ
-            frame_queue.put(None)  # ֪ͨʾ߳˳
+            close_session(session)
+            display_stop.set()  # ֪ͨʾ߳˳
             display_thread.join(timeout=1)
             executor.shutdown(wait=False)
+            image_writer.close()
             print("[Server] ˳")
 
 
+# ---------- asyncio ģʽ ----------
+async def handle_client_async(conn, addr):
+    """ӵĽЭ̣ĽջỰϿֻԼĴ"""
+    loop = asyncio.get_running_loop()
+    name = f"{addr[0]}:{addr[1]}"
+    # ÿһͼĿ¼ͬһ IP Ķӻһ
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    session = ClientSession(name, os.path.join(SAVE_DIR, f"{name.replace(':', '_')}_{stamp}"))
+    register_session(session)
+    print(f"[Server] : {addr}")
+
+    ring = RecvRing(RING_CAPACITY)
+    try:
+        while True:
+            n = await loop.sock_recv_into(conn, ring.reserve(BUFFER_SIZE))
+            if n == 0:
+                break
+            ring.commit(n)
+            M_RECV_BYTES.inc(n)
+            if DECODE_QUEUE_POLICY == 'block':
+                # ڽʱ𣬷ŵ߳⿨ס
+                await asyncio.to_thread(receive_into_ring, ring, session)
+            else:
+                receive_into_ring(ring, session)
+    except ConnectionResetError:
+        print(f"[Server] ͻ˶Ͽ: {addr}")
+    except Exception as e:
+        print(f"[Server] 쳣({addr}): {e}")
+    finally:
+        conn.close()
+        await asyncio.to_thread(close_session, session)
+        print(f"[Server] ӹر: {addr}")
+
+
+async def serve_async():
+    loop = asyncio.get_running_loop()
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((SERVER_IP, PORT))
+        s.listen()
+        s.setblocking(False)
+        print(f"[Server]  {SERVER_IP}:{PORT}ģʽ")
+
+        tasks = set()
+        while True:
+            conn, addr = await loop.sock_accept(s)
+            conn.setblocking(False)
+            if SOCKET_RCVBUF:
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_RCVBUF)
+            task = asyncio.create_task(handle_client_async(conn, addr))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+
+def run_async_server():
+    metrics.serve(METRICS_PORT)
+    display_thread = threading.Thread(target=display_worker, daemon=True)
+    display_thread.start()
+
+    try:
+        asyncio.run(serve_async())
+    except KeyboardInterrupt:
+        print("\n[Server] յжź")
+    finally:
+        display_stop.set()
+        display_thread.join(timeout=1)
+        executor.shutdown(wait=False)
+        image_writer.close()
+        print("[Server] ˳")
+
+
 if __name__ == '__main__':
-    run_server()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="ͼն")
+    parser.add_argument('--mode', choices=['async', 'single'], default=SERVER_MODE,
+                        help="asyncӡsingleӣϿ˳")
+    args = parser.parse_args()
+    if args.mode == 'async':
+        run_async_server()
+    else:
+        run_server()
\ No newline at end of file
@@ -3,11 +3,18 @@ import socket
 import struct
 import os
 import threading
+import time
 import numpy as np
 import cv2
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import yaml
+import metrics
+from async_writer import AsyncWriter, unique_path
+from stereo_rectify import get_rectifier
+from stereo_recorder import StereoRecorder
+from stereo_depth import DepthEngine, DepthWorker, draw_readout, save_depth
+from frame_ring import FrameRing, BurstWriter
+import stereo_protocol as proto
 
 SERVER_IP = '0.0.0.0'
 PORT_LARGE = 5002
@@ -15,32 +22,298 @@ SAVE_DIR = 'received_data/stero'
 IMAGE_DIR = 'received_data/image'
 BUFFER_SIZE = 4096
 MAX_IMAGE_SIZE = 10 * 1024 * 1024
-
-os.makedirs(SAVE_DIR, exist_ok=True)
-os.makedirs(IMAGE_DIR, exist_ok=True)
-
-file_io_lock = threading.Lock()
-
-def load_camera_params(yaml_path: str):
-    with open(yaml_path, "r") as f:
-        data = yaml.safe_load(f)
-    cam_matrix = np.array(data["camera_matrix"]["data"]).reshape((3, 3))
-    dist_coeffs = np.array(data["distortion_coefficients"]["data"]).reshape((1, 5))
-    rect_matrix = np.array(data["rectification_matrix"]["data"]).reshape((3, 3))
-    proj_matrix = np.array(data["projection_matrix"]["data"]).reshape((3, 4))
-    return cam_matrix, dist_coeffs, rect_matrix, proj_matrix
+METRICS_PORT = 9102  # ָ˵˿ڣ RECEIVER_METRICS=1 Ż
+RECORD_DIR = 'received_data/stero_record'  # У¼ƵĿ¼ʾа r ʼ/ֹͣ
+RECORD_ON_START = False  # ʼ¼
+DEPTH_ON_START = False  # ȼ㣻ʾа p أ z 浱ǰ
+DEPTH_TARGET_FPS = 10.0  # ȼĿ֡
+DEPTH_DIR = 'received_data/depth'
+PREVIEW_SCALE = 2  # Ԥڰ 1/N ֱʽ루1248¼ʼʹȫֱ
+# Ϊ 2.0򻷾 STEREO_PRETRIGGER_SECONDS=2ʱ s/d/f Ᵽ津ǰôԭʼ֡Ĭ 0 ر
+PRETRIGGER_SECONDS = float(os.environ.get('STEREO_PRETRIGGER_SECONDS', 0))
+POSTTRIGGER_SECONDS = 1.0  # Լô
+PRETRIGGER_BUDGET = 256 * 1024 * 1024  # ǰڴޣʱ̭ɵ֡
+SAVE_ENCODE_WORKERS = 2  #  JPEG ߳
+SAVE_FSYNC = True  # ÿļдͳһ fsync
+CLOCK_SYNC_INTERVAL = 2.0  # ʱ룩ֻԷ 0x02 ֡ӽ
+LINK_REPORT_INTERVAL = 5.0  # ӡ֡ʱӵļ룩
+FULL_FETCH_TIMEOUT = 2.0  # Ԥ°ʱͶȡȫֱ֡ĳʱ룩ں̨߳еȴ
+
+M_RECV_BYTES = metrics.counter('stereo_recv_bytes_total', 'ֽ')
+M_PARSE = metrics.histogram('stereo_parse_seconds', 'ÿ recv ʱ')
+M_DECODE = metrics.histogram('stereo_decode_seconds', '֡ȫֱʽʱ')
+M_PREVIEW_DECODE = metrics.histogram('stereo_preview_decode_seconds', '֡Ԥʱ')
+M_FRAMES = metrics.counter('stereo_frames_total', 'յ֡')
+M_DROPPED = metrics.counter('stereo_frames_dropped_total', 'δʾͱ֡ǵ֡')
+M_SAVE = metrics.histogram('stereo_save_seconds', 'һΰʾ߳еĺʱ')
+M_LOST = metrics.counter('stereo_frames_lost_total', '֡·϶ʧ֡')
+M_REORDERED = metrics.counter('stereo_frames_reordered_total', 'յ֡ĳٵ֡')
+M_NET_LATENCY = metrics.histogram('stereo_network_latency_seconds', 'ӷͶ˲ɼһ֡ʱ')
+M_FRAME_LATENCY = metrics.histogram('stereo_frame_latency_seconds', 'ӷͶ˲ɼ״νɵʱ')
+M_PREVIEW_FRAMES = metrics.counter('stereo_preview_frames_total', 'յĵͷֱԤ֡')
+M_FULL_FETCH = metrics.histogram('stereo_full_fetch_seconds', 'Ͷȡһ֡ȫֱͼĺʱ')
+M_SAVE_WRITE = metrics.histogram('stereo_save_write_seconds', 'ύ̵ĺʱ')
+
+# s/d/f ֱ湲õĺ̨д̷ʾֻ߳׼أд̶ں̨
+#  init_runtime() ú˵
+save_writer = None
+
+
+def save_queue_depth():
+    return save_writer.pending() if save_writer is not None else 0
+
+
+M_SAVE_QUEUE = metrics.gauge('stereo_save_queue_depth', 'δ̵ı', save_queue_depth)
+JPEG_PARAMS = [int(cv2.IMWRITE_JPEG_QUALITY), 100]
 
 yaml_dir = "yaml"
 left_yaml = os.path.join(yaml_dir, "left.yaml")
 right_yaml = os.path.join(yaml_dir, "right.yaml")
-camL, distL, rectL, projL = load_camera_params(left_yaml)
-camR, distR, rectR, projR = load_camera_params(right_yaml)
 
+
+def get_camera_params():
+    """궨״ʹʱأֻʱ궨ļ"""
+    rectifier = get_stereo_rectifier()
+    return rectifier.left_params, rectifier.right_params
+
+
+def get_stereo_rectifier():
+    """УӳߴֻһΣ yaml/.rectify_cache"""
+    return get_rectifier(left_yaml, right_yaml)
+
+
+PREVIEW_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+class StereoFrame:
+    """һ֡˫Ŀͼֻյ JPEG ֽڣҪʱŽ벢
+
+    capture_ts ΪͶ˲ɼʱ任㵽ʱӺɸʽ֡δʱΪ None
+    ״νʱݴ˼¼˵ʱӡ
+
+    Ԥ0x03ֻ֡ preview_jpeg ͷȫֱʳߴ full_sizejpeg Ϊ None
+    һҪȫֱʱ fetch() ͶȡضӦŵȫֱ JPEG
+    һ÷ʾ߳ needs_fetch()
+    """
+
+    def __init__(self, seq, timestamp, jpeg, capture_ts=None, link=None, preview_jpeg=None, fetch=None,
+                 full_size=None):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.jpeg = jpeg
+        self.preview_jpeg = preview_jpeg
+        self.full_size = full_size
+        self.capture_ts = capture_ts
+        self.link = link
+        self._fetch = fetch
+        self._full = None
+        self._preview = None
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    def _decoded(self):
+        if self.capture_ts is not None:
+            latency = time.time() - self.capture_ts
+            self.capture_ts = None
+            M_FRAME_LATENCY.observe(latency)
+            if self.link is not None:
+                self.link.on_decoded(latency)
+
+    def needs_fetch(self):
+        """ȫֱ JPEG ڷͶˣfull() ȡػʱ"""
+        return self.jpeg is None and self._fetch is not None
+
+    def preview_split(self, width):
+        """Ϊ width ԤͼĿķֽ"""
+        if self.preview_jpeg is None:
+            return SPLIT_X // PREVIEW_SCALE
+        # ɷͶ˵Ԥ֡ߴ磬Ҹ뻻
+        full_width = self.full_size[0] if self.full_size else 2 * SPLIT_X
+        return SPLIT_X * width // full_width
+
+    def full(self):
+        """ȫֱأУʹãʧܷ None"""
+        if self.needs_fetch():
+            # ȡ֡ȴڼ䲻ӰԤ
+            with self._fetch_lock:
+                if self.needs_fetch():
+                    t0 = time.perf_counter()
+                    jpeg = self._fetch()
+                    M_FULL_FETCH.observe(time.perf_counter() - t0)
+                    if jpeg is None:
+                        print("[Server] δܴӷͶȡȫֱ֡")
+                    with self._lock:
+                        self.jpeg, self._fetch = jpeg, None
+        with self._lock:
+            if self._full is None and self.jpeg is not None:
+                t0 = time.perf_counter()
+                self._full = cv2.imdecode(np.frombuffer(self.jpeg, np.uint8), cv2.IMREAD_COLOR)
+                M_DECODE.observe(time.perf_counter() - t0)
+                self._decoded()
+            return self._full
+
+    def preview(self):
+        """ԤأԤֱӽСͼ PREVIEW_SCALE Сȫֱ JPEG"""
+        if self.preview_jpeg is not None:
+            with self._lock:
+                if self._preview is None:
+                    t0 = time.perf_counter()
+                    self._preview = cv2.imdecode(np.frombuffer(self.preview_jpeg, np.uint8), cv2.IMREAD_COLOR)
+                    M_PREVIEW_DECODE.observe(time.perf_counter() - t0)
+                    self._decoded()
+                return self._preview
+        if PREVIEW_SCALE == 1:
+            return self.full()
+        with self._lock:
+            if self._preview is None:
+                t0 = time.perf_counter()
+                self._preview = cv2.imdecode(np.frombuffer(self.jpeg, np.uint8), PREVIEW_DECODE_FLAGS[PREVIEW_SCALE])
+                M_PREVIEW_DECODE.observe(time.perf_counter() - t0)
+                self._decoded()
+            return self._preview
+
+
+# ߳ÿյһ֡ͷһµ StereoFrame ţ
+# ֻ߳ȡ
 latest_large_frame = None
+latest_frame_seq = 0
+latest_shown_seq = 0
 latest_frame_lock = threading.Lock()
+recorder = None
+SPLIT_X = 1280  # תĿķֽ
+
+# ԤʱȴͶ˷ȫֱ̰֡߳贴
+fetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='full-fetch')
+
+# ǰֻѹֽڣͬʱʱֽԤ
+pretrigger_ring = None
+burst_writer = None
+
+
+def init_runtime():
+    """Ŀ¼д̷ʹǰ
+
+    ¼ƵĹ spawn ʽѱģ鵱 __mp_main__ µ룬
+    Щ̻߳д̵ĳʼܷģ鶥㣬ֻ run_server() еһΡ
+    """
+    global save_writer, pretrigger_ring, burst_writer
+    os.makedirs(SAVE_DIR, exist_ok=True)
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    save_writer = AsyncWriter('Server ', encode_workers=SAVE_ENCODE_WORKERS,
+                              fsync=SAVE_FSYNC, observe_latency=M_SAVE_WRITE.observe)
+    if PRETRIGGER_SECONDS > 0:
+        pretrigger_ring = FrameRing(PRETRIGGER_BUDGET, PRETRIGGER_SECONDS + POSTTRIGGER_SECONDS + 1.0)
+        burst_writer = BurstWriter(pretrigger_ring, PRETRIGGER_SECONDS, POSTTRIGGER_SECONDS)
+
+
+def get_latest_frame():
+    """ (, StereoFrame)û֡ʱΪ (0, None)"""
+    with latest_frame_lock:
+        return latest_frame_seq, latest_large_frame
+
+
+def rotated_crop(frame, x0, x1):
+    """ȼ cv2.rotate(frame, cv2.ROTATE_180)[:, x0:x1]ֻתһ"""
+    w = frame.shape[1]
+    return cv2.rotate(frame[:, w - x1:w - x0], cv2.ROTATE_180)
+
+
+def start_recording():
+    global recorder
+    if recorder is None:
+        out_dir = os.path.join(RECORD_DIR, datetime.now().strftime('%Y%m%d_%H%M%S'))
+        recorder = StereoRecorder(out_dir, left_yaml, right_yaml)
+
+
+def stop_recording():
+    global recorder
+    rec, recorder = recorder, None
+    if rec is not None:
+        rec.close()
+
+
+depth_worker = None
+depth_preview_warned = False
+
+
+def rectified_pair(last_seq):
+    """̵߳ȡ֡֡ʱ (, ʱ, Уͼ, Уͼ)
+
+    Ԥ֡ȼ㣺֡ȡȫֱͼԤʡĴ
+    Уȫֱʱ궨ֱСԤͼϡ
+    """
+    global depth_preview_warned
+    seq, frame = get_latest_frame()
+    if frame is None or seq == last_seq:
+        return None
+    if frame.needs_fetch():
+        if not depth_preview_warned:
+            depth_preview_warned = True
+            print("[Server] ͶΪԤȼͣҪȫֱ֡")
+        return None
+    img = frame.full()
+    if img is None:
+        return None
+    left = rotated_crop(img, SPLIT_X, img.shape[1])
+    right = rotated_crop(img, 0, SPLIT_X)
+    left, right = get_stereo_rectifier().rectify(left, right)
+    return seq, frame.timestamp, left, right
+
+
+def start_depth():
+    global depth_worker
+    if depth_worker is None:
+        rectifier = get_stereo_rectifier()
+        engine = DepthEngine(rectifier.left_params, rectifier.right_params)
+        depth_worker = DepthWorker(engine, rectified_pair, DEPTH_TARGET_FPS)
+        print(f"[Server] ȼѿ{engine.algorithm}С {engine.levels} {engine.strips} ")
+
+
+def stop_depth():
+    global depth_worker
+    worker, depth_worker = depth_worker, None
+    if worker is not None:
+        worker.stop()
+        print("[Server] ȼѹر")
+
+
+def publish_frame(data, capture_ts=None, link=None, fetch=None, full_size=None):
+    """߳յһ֡ JPEGȥ¼ƺʹǰ棬Ϊ֡
+
+     fetch ʱ data ǵͷֱԤ֡ǰ汣Ԥͼ
+    ¼Ҫȫֱ֡˲¼ơ
+    """
+    global latest_large_frame, latest_frame_seq
+    M_FRAMES.inc()
+    rec = recorder
+    if rec is not None and fetch is None:
+        rec.submit(data)
+    now = time.time()
+    if pretrigger_ring is not None:
+        pretrigger_ring.append(now, data)
+    if fetch is None:
+        frame_args = (data, capture_ts, link)
+    else:
+        frame_args = (None, capture_ts, link, data, fetch, full_size)
+    #  socket ߳̽룬ֻһ֡ԭʼֽ
+    with latest_frame_lock:
+        if latest_shown_seq != latest_frame_seq:
+            M_DROPPED.inc()
+        latest_frame_seq += 1
+        latest_large_frame = StereoFrame(latest_frame_seq, now, *frame_args)
+
 
-def parse_large_messages(buf):
-    global latest_large_frame
+def parse_large_messages(buf, link=None, requests=None):
+    """ buf Ϣʣಿ
+
+    link Ϊӵ LinkStatsڶ֡/ʱͳƺͶʱrequests Ϊӵ
+    FullFrameRequestsԤ֡ȡȫֱͼ
+    """
     offset = 0
     n = len(buf)
 
@@ -61,14 +334,39 @@ def parse_large_messages(buf):
         frame_type = buf[frame_start]
         data_start = frame_start + 1
         data_end = data_start + (L - 1)
-        data = buf[data_start:data_end]
 
-        if frame_type == 0x01:
-            arr = np.frombuffer(data, np.uint8)
-            img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-            if img is not None:
-                with latest_frame_lock:
-                    latest_large_frame = img
+        if frame_type == proto.FRAME_JPEG:
+            publish_frame(buf[data_start:data_end])
+        elif frame_type in (proto.FRAME_JPEG_V2, proto.FRAME_PREVIEW):
+            header = proto.parse_frame_header(buf, data_start, data_end)
+            if header is not None:
+                seq, capture_us, jpeg_start = header
+                capture_ts = None
+                if link is not None:
+                    lost, reordered = link.lost, link.reordered
+                    capture_ts = link.on_frame(seq, capture_us, time.time())
+                    if link.lost > lost:
+                        M_LOST.inc(link.lost - lost)
+                    if link.reordered > reordered:
+                        M_REORDERED.inc(link.reordered - reordered)
+                    if capture_ts is not None:
+                        M_NET_LATENCY.observe(time.time() - capture_ts)
+                fetch = full_size = None
+                if frame_type == proto.FRAME_PREVIEW:
+                    M_PREVIEW_FRAMES.inc()
+                    full_size = proto.preview_full_size(buf, data_start)
+                    if requests is not None:
+                        fetch = lambda seq=seq: requests.fetch(seq)
+                    else:
+                        fetch = lambda: None
+                publish_frame(buf[jpeg_start:data_end], capture_ts, link, fetch, full_size)
+        elif frame_type == proto.FRAME_FULL and requests is not None:
+            header = proto.parse_frame_header(buf, data_start, data_end)
+            if header is not None:
+                seq, _, jpeg_start = header
+                requests.on_response(seq, buf[jpeg_start:data_end])
+        elif frame_type == proto.CLOCK_PONG and link is not None:
+            link.clock.on_pong(buf[data_start:data_end])
 
         # ƶһλ
         offset = data_end
@@ -80,120 +378,206 @@ def parse_large_messages(buf):
 def handle_large_client(conn, addr):
     print(f"[Server] ͼ: {addr}")
     buf = b''
+    link = proto.LinkStats(CLOCK_SYNC_INTERVAL)
+    send_lock = threading.Lock()
+
+    def send(message):
+        # ̣߳ʱʾ̣߳ȡȫֱ֡д
+        with send_lock:
+            conn.sendall(message)
+
+    requests = proto.FullFrameRequests(send, FULL_FETCH_TIMEOUT)
+    next_report = time.monotonic() + LINK_REPORT_INTERVAL
     try:
         while True:
             data = conn.recv(BUFFER_SIZE)
             if not data:
                 break
+            M_RECV_BYTES.inc(len(data))
             buf += data
-            buf = parse_large_messages(buf)
+            t0 = time.perf_counter()
+            buf = parse_large_messages(buf, link, requests)
+            M_PARSE.observe(time.perf_counter() - t0)
+
+            now = time.monotonic()
+            if link.ping_due(now):
+                send(proto.ping())
+            if link.versioned and now >= next_report:
+                next_report = now + LINK_REPORT_INTERVAL
+                report = link.report()
+                if report:
+                    print(f"[Server] · {addr}: {report}")
     except Exception as e:
         print(f"[Server] ͼ쳣: {e}")
     finally:
+        requests.close()
         conn.close()
         print(f"[Server] ͼӹر: {addr}")
 
-def save_current_frame():
-    global latest_large_frame
-    with latest_frame_lock:
-        if latest_large_frame is None:
-            print("[Server] ͼ񻺴棬޷")
-            return
-        img_to_save = latest_large_frame.copy()
-
-    img_to_save = cv2.rotate(img_to_save, cv2.ROTATE_180)
-    left_img = img_to_save[:, 1280:]
-    right_img = img_to_save[:, :1280]
-
-    left_img = cv2.remap(left_img, *cv2.initUndistortRectifyMap(
-        camL, distL, rectL, projL, (left_img.shape[1], left_img.shape[0]), cv2.CV_32FC1), cv2.INTER_LINEAR)
-    right_img = cv2.remap(right_img, *cv2.initUndistortRectifyMap(
-        camR, distR, rectR, projR, (right_img.shape[1], right_img.shape[0]), cv2.CV_32FC1), cv2.INTER_LINEAR)
-
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
-    left_path = os.path.join(SAVE_DIR, f"left_{timestamp}.jpg")
-    right_path = os.path.join(SAVE_DIR, f"right_{timestamp}.jpg")
-    with file_io_lock:
-        success_left = cv2.imwrite(left_path, left_img, [int(cv2.IMWRITE_JPEG_QUALITY), 100])
-        success_right = cv2.imwrite(right_path, right_img, [int(cv2.IMWRITE_JPEG_QUALITY), 100])
-    if success_left and success_right:
-        print(f"[Server] رɹ: {left_path}  {right_path}")
+def with_latest_pixels(callback):
+    """Ѱʱһ֡ȫֱؽ callback(img)
+
+    Ԥ֡ҪͶȡȫֱͼ FULL_FETCH_TIMEOUT 룩
+    ʱں̨߳ȡ֡ callbackʾ߳أֱڵǰ̵߳á
+    û֡ʧʱӡԭ򣬲 callback
+    """
+    _, frame = get_latest_frame()
+    if frame is None:
+        print("[Server] ͼ񻺴棬޷")
+        return
+    if frame.needs_fetch():
+        fetch_executor.submit(_pixels_to, frame, callback)
     else:
-        print("[Server] ͼƬʧ")
+        _pixels_to(frame, callback)
+
+
+def _pixels_to(frame, callback):
+    img = frame.full()
+    if img is None:
+        print("[Server] ͼʧܣ޷")
+        return
+    try:
+        callback(img)
+    except Exception as e:
+        print(f"[Server] 쳣: {e}")
+
+
+def save_done(paths, ok_msg, fail_msg):
+    """һαļ̺ӡһνд̻ѹӳ"""
+    results = {}
+    lock = threading.Lock()
+
+    def on_done(path, ok):
+        with lock:
+            results[path] = ok
+            if len(results) < len(paths):
+                return
+        pending, avg, worst = save_writer.stats()
+        stat = f"ѹ {pending}дӳ ƽ {avg * 1000:.0f} ms /  {worst * 1000:.0f} ms"
+        print((ok_msg if all(results.values()) else fail_msg) + stat)
+
+    return on_done
+
+
+def save_current_frame():
+    with_latest_pixels(save_stereo_pair)
+
+
+def save_stereo_pair(img_to_save):
+    left_img = rotated_crop(img_to_save, SPLIT_X, img_to_save.shape[1])
+    right_img = rotated_crop(img_to_save, 0, SPLIT_X)
+
+    left_img, right_img = get_stereo_rectifier().rectify(left_img, right_img)
+
+    left_path = unique_path(SAVE_DIR, 'left_')
+    right_path = os.path.join(SAVE_DIR, 'right_' + os.path.basename(left_path)[len('left_'):])
+    on_done = save_done((left_path, right_path),
+                        f"[Server] رɹ: {left_path}  {right_path}", "[Server] ͼƬʧ")
+    save_writer.submit_image(left_path, left_img, JPEG_PARAMS, on_done)
+    save_writer.submit_image(right_path, right_img, JPEG_PARAMS, on_done)
 
 def save_display_right_image():
-    global latest_large_frame
-    with latest_frame_lock:
-        if latest_large_frame is None:
-            print("[Server] ͼ񻺴棬޷")
-            return
-        full_img = latest_large_frame.copy()
+    with_latest_pixels(lambda full_img: save_right_image(full_img, IMAGE_DIR, 'display_', "ǰͼ"))
 
-    full_img = cv2.rotate(full_img, cv2.ROTATE_180)
-    right_img = full_img[:, 1280:]
 
-    save_time = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
-    save_path = os.path.join(IMAGE_DIR, f"display_{save_time}.jpg")
+def save_right_image(full_img, out_dir, prefix, label):
+    right_img = rotated_crop(full_img, SPLIT_X, full_img.shape[1])
 
-    with file_io_lock:
-        success = cv2.imwrite(save_path, right_img, [int(cv2.IMWRITE_JPEG_QUALITY), 100])
+    save_path = unique_path(out_dir, prefix)
+    on_done = save_done((save_path,), f"[Server] {label}ɹ: {save_path}", f"[Server] {label}ʧ")
+    save_writer.submit_image(save_path, right_img, JPEG_PARAMS, on_done)
+
+def save_burst(out_dir):
+    """Ѵǰ󴰿ڵԭʼ֡д out_dir/burst_<ʱ>ں̨"""
+    if burst_writer is None:
+        return
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
+    burst_writer.trigger(os.path.join(out_dir, f"burst_{stamp}"), time.time())
 
-    if success:
-        print(f"[Server] ǰͼ񱣴ɹ: {save_path}")
-    else:
-        print("[Server] 浱ǰͼʧ")
 
 def display_worker():
+    global latest_shown_seq
     window_name = 'Server Stream - Right Image'
     cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
     cv2.resizeWindow(window_name, 1280, 720)
 
     fish_dir = "received_data/fish"
     os.makedirs(fish_dir, exist_ok=True)
+    depth_window = 'Depth'
+    depth_shown_seq = None
 
     while True:
-        with latest_frame_lock:
-            frame = None if latest_large_frame is None else latest_large_frame.copy()
-
-        if frame is not None:
-            frame = cv2.rotate(frame, cv2.ROTATE_180)
-            right_img = frame[:, 1280:]
-            cv2.imshow(window_name, right_img)
+        # ֻű仯ʱػֻתʾһ
+        seq, frame = get_latest_frame()
+        if frame is not None and seq != latest_shown_seq:
+            latest_shown_seq = seq
+            preview = frame.preview()
+            if preview is not None:
+                split = frame.preview_split(preview.shape[1])
+                cv2.imshow(window_name, rotated_crop(preview, split, preview.shape[1]))
+
+        worker = depth_worker
+        result = worker.latest if worker is not None else None
+        if result is not None and result.seq != depth_shown_seq:
+            depth_shown_seq = result.seq
+            cv2.imshow(depth_window, draw_readout(result, worker.engine))
 
         key = cv2.waitKey(30) & 0xFF
         if key == 27:  # ESC
             print("[Server] ˳ʾ")
             break
         elif key == ord('s'):
+            t0 = time.perf_counter()
+            save_burst(SAVE_DIR)
             save_current_frame()
+            M_SAVE.observe(time.perf_counter() - t0)
         elif key == ord('d'):
+            t0 = time.perf_counter()
+            save_burst(IMAGE_DIR)
             save_display_right_image()
+            M_SAVE.observe(time.perf_counter() - t0)
+        elif key == ord('r'):
+            if recorder is None:
+                start_recording()
+            else:
+                threading.Thread(target=stop_recording, daemon=True).start()
+        elif key == ord('p'):
+            if depth_worker is None:
+                start_depth()
+            else:
+                stop_depth()
+                depth_shown_seq = None
+                cv2.destroyWindow(depth_window)
+        elif key == ord('z'):
+            result = depth_worker.latest if depth_worker is not None else None
+            if result is None:
+                print("[Server] ûпɱȽ")
+                continue
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
+            ok, color_path, depth_path = save_depth(result, DEPTH_DIR, stamp)
+            if ok:
+                print(f"[Server] ȱɹ: {color_path}  {depth_path}")
+            else:
+                print("[Server] ȱʧ")
         elif key == ord('f'):
+            t0 = time.perf_counter()
             # 浽 fish ļ
-            with latest_frame_lock:
-                if latest_large_frame is None:
-                    print("[Server] ͼ񻺴棬޷")
-                    continue
-                full_img = latest_large_frame.copy()
-
-            full_img = cv2.rotate(full_img, cv2.ROTATE_180)
-            right_img = full_img[:, 1280:]
-
-            save_time = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
-            save_path = os.path.join(fish_dir, f"fish_{save_time}.jpg")
-
-            with file_io_lock:
-                success = cv2.imwrite(save_path, right_img, [int(cv2.IMWRITE_JPEG_QUALITY), 100])
-
-            if success:
-                print(f"[Server] ͼ񱣴ɹ: {save_path}")
-            else:
-                print("[Server] ͼ񱣴ʧ")
+            save_burst(fish_dir)
+            with_latest_pixels(lambda full_img: save_right_image(full_img, fish_dir, 'fish_', "ͼ"))
+            M_SAVE.observe(time.perf_counter() - t0)
 
     cv2.destroyAllWindows()
 
 
 def run_server():
+    init_runtime()
+    # ʱر궨Ԥ 1280x720 Уʱٵȴ
+    get_stereo_rectifier().maps((1280, 720))
+    if RECORD_ON_START:
+        start_recording()
+    if DEPTH_ON_START:
+        start_depth()
+    metrics.serve(METRICS_PORT)
     display_thread = threading.Thread(target=display_worker, daemon=True)
     display_thread.start()
 
@@ -217,6 +601,12 @@ def run_server():
         print("\n[Server] յжźţ˳")
     finally:
         s_large.close()
+        stop_recording()
+        stop_depth()
+        if burst_writer is not None:
+            burst_writer.close()
+        fetch_executor.shutdown(wait=False)
+        save_writer.close()
         print("[Server] ˳")
 
 if __name__ == '__main__':
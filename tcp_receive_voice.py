@@ -7,20 +7,56 @@ import numpy as np
 import sounddevice as sd
 import time
 from contextlib import contextmanager
+import metrics
+from jitter_buffer import JitterBuffer
+from audio_recorder import AudioRecorder
+from stream_vad import StreamVad
 
 #   
 HOST, PORT = '0.0.0.0', 5001
 SAVE_AUDIO_DIR = 'received_data/audio'
 AUDIO_CHUNK = 1024
+SAMPLE_RATE = 44100
+PLAYBACK_BUFFER_SECONDS = 10  # ŻλдµĲ
+MIN_LATENCY = 0.04  # Ŀӳޣ룩
+MAX_LATENCY = 0.5  # Ŀӳޣ룩
+MAX_DRIFT = 0.005  # ƯƲٱ
+REPORT_INTERVAL = 5  # ڼӡȡǷغӳٵļ룩
+RECORD_STREAM = False  # ʵʱ PCM ֶ¼Ƶ RECORD_DIR
+RECORD_DIR = 'received_data/audio_stream'
+RECORD_FORMAT = 'wav'  # 'wav'  'flac'flac Ҫ soundfile
+RECORD_SEGMENT_SECONDS = 600  # ÿʱ룩
+VAD_ENABLED = False  # ʵʱ⣬ԶƬе CUTS_DIR
+CUTS_DIR = 'received_data/cuts'
+IDENTIFY_ENABLED = False  # ʵʱʶҪ mvectorģͳפCPU 
+IDENTIFY_WINDOW = 2.0  # ʶ𴰿ڳȣ룩
+IDENTIFY_HOP = 0.5  # ʶ𴰿ڲ룩
 SOCKET_TIMEOUT = 1  # socketʱ
+METRICS_PORT = 9103  # ָ˵˿ڣ RECEIVER_METRICS=1 Ż
 
 os.makedirs(SAVE_AUDIO_DIR, exist_ok=True)
 
 #  ȫ״̬ 
-playback_buf = []
-playback_lock = threading.Lock()  # Ż
+# ߳дصӦ壨λ壩صﲻڴ
+playback_buf = JitterBuffer(SAMPLE_RATE, PLAYBACK_BUFFER_SECONDS, AUDIO_CHUNK,
+                            MIN_LATENCY, MAX_LATENCY, MAX_DRIFT)
 running = True
 conn = None  # Ӷ
+recorder = None  # RECORD_STREAM ʱĺֶ̨¼
+vad = None  # VAD_ENABLED ʱĺ̨ж
+identifier = None  # IDENTIFY_ENABLED ʱʵʱʶ
+
+#  ָ 
+M_RECV_BYTES = metrics.counter('voice_recv_bytes_total', 'ֽ')
+M_PACKETS = metrics.counter('voice_pcm_packets_total', 'յ PCM ')
+M_UNDERRUNS = metrics.counter('voice_underruns_total', 'Żص岻Ĵ')
+M_OVERFLOW = metrics.counter('voice_overflow_samples_total', 'ŻĲ')
+M_BUFFER_DEPTH = metrics.gauge('voice_buffer_samples', 'ŻеĲ', lambda: len(playback_buf))
+M_SAVE = metrics.histogram('voice_save_seconds', 'wav ϴд̺ʱ')
+M_LATENCY = metrics.gauge('voice_buffer_latency_seconds', '嵱ǰӳ', playback_buf.latency)
+M_TARGET = metrics.gauge('voice_target_latency_seconds', 'Ŀӳ', lambda: playback_buf.target / SAMPLE_RATE)
+M_JITTER = metrics.gauge('voice_jitter_seconds', '', lambda: playback_buf.jitter)
+M_RATIO = metrics.gauge('voice_resample_ratio', 'ƯƲĵǰٱ', lambda: playback_buf.ratio)
 
 
 @contextmanager
@@ -38,18 +74,10 @@ def socket_context(*args, **kwargs):
 
 
 def audio_callback(outdata, frames, t, status):
-    global playback_buf
-    with playback_lock:  # ʻ
-        available = len(playback_buf)
-        if available < frames:
-            outdata[:, 0] = np.zeros(frames, dtype=np.float32)
-            if available > 0:
-                outdata[:available, 0] = np.array(playback_buf, dtype=np.float32)
-                playback_buf = []
-        else:
-            chunk = playback_buf[:frames]
-            playback_buf = playback_buf[frames:]
-            outdata[:, 0] = np.array(chunk, dtype=np.float32)
+    underruns = playback_buf.underruns
+    playback_buf.read_into(outdata[:, 0])
+    if playback_buf.underruns != underruns:
+        M_UNDERRUNS.inc()
 
 
 def recvall(sock, n):
@@ -71,11 +99,15 @@ def recvall(sock, n):
 
 
 def network_thread(conn):
-    global playback_buf, running
+    global running
     wav_count = 1
     print('[] ߳ȴ...')
 
     try:
+        playback_buf.reset_arrivals()
+        if recorder is not None:
+            # ӵĲһӲ¼һΣʱ䶨λ׼ȷ
+            recorder.mark_discontinuity()
         conn.settimeout(SOCKET_TIMEOUT)  # socketʱ
         while running:
             h = recvall(conn, 4)
@@ -87,9 +119,18 @@ def network_thread(conn):
                 data = recvall(conn, length)
                 if data is None:
                     continue
+                M_RECV_BYTES.inc(4 + length)
+                M_PACKETS.inc()
                 pcm = np.frombuffer(data, dtype=np.float32)
-                with playback_lock:  # ޸Ļ
-                    playback_buf += pcm.tolist()
+                written = playback_buf.write(pcm)
+                if written < len(pcm):
+                    M_OVERFLOW.inc(len(pcm) - written)
+                if recorder is not None:
+                    recorder.submit(pcm)
+                if vad is not None:
+                    vad.submit(pcm)
+                if identifier is not None:
+                    identifier.submit(pcm)
                 time.sleep(0.005)
             else:
                 fl = recvall(conn, 4)
@@ -102,11 +143,14 @@ def network_thread(conn):
                 wav = recvall(conn, file_len)
                 if wav is None:
                     continue
+                M_RECV_BYTES.inc(8 + file_len)
+                t0 = time.perf_counter()
                 from datetime import datetime
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 path = os.path.join(SAVE_AUDIO_DIR, f"{timestamp}.wav")
                 with open(path, 'wb') as f:
                     f.write(wav)
+                M_SAVE.observe(time.perf_counter() - t0)
                 print(f'[] ѱ¼ļ{path}')
                 wav_count += 1
     except Exception as e:
@@ -119,17 +163,28 @@ def network_thread(conn):
 
 
 def run_server():
-    global running, conn
+    global running, conn, recorder, vad, identifier
 
     with socket_context(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         s.bind((HOST, PORT))
         s.listen(1)
         print(f'[] ˿ {PORT}')
+        metrics.serve(METRICS_PORT)
+        if RECORD_STREAM:
+            from datetime import datetime
+            out_dir = os.path.join(RECORD_DIR, datetime.now().strftime('%Y%m%d_%H%M%S'))
+            recorder = AudioRecorder(out_dir, SAMPLE_RATE, RECORD_SEGMENT_SECONDS, RECORD_FORMAT)
+        if VAD_ENABLED:
+            vad = StreamVad(SAMPLE_RATE, CUTS_DIR)
+        if IDENTIFY_ENABLED:
+            # ֻڿʱ룬ⲻʶʱҲ torch
+            from voice_stream_detect import create_identifier
+            identifier = create_identifier(SAMPLE_RATE, window=IDENTIFY_WINDOW, hop=IDENTIFY_HOP)
 
         try:
             with sd.OutputStream(
-                    samplerate=44100, channels=1,
+                    samplerate=SAMPLE_RATE, channels=1,
                     dtype='float32', blocksize=AUDIO_CHUNK,
                     callback=audio_callback
             ) as stream:
@@ -143,9 +198,18 @@ def run_server():
                         net_thread = threading.Thread(target=network_thread, args=(conn,))
                         net_thread.daemon = True
                         net_thread.start()
-                        # ȴ߳̽
+                        # ȴ߳̽ӣڼ䶨ڴӡ״̬
+                        next_report = time.monotonic() + REPORT_INTERVAL
                         while net_thread.is_alive():
                             time.sleep(0.1)
+                            if time.monotonic() >= next_report:
+                                next_report += REPORT_INTERVAL
+                                print(f'[] : {playback_buf.report()}'
+                                      f'ӳ {stream.latency * 1000:.0f} ms')
+                                if vad is not None:
+                                    print(f'[] {vad.report()}')
+                                if identifier is not None:
+                                    print(f'[] {identifier.report()}')
                     except KeyboardInterrupt:
                         break
                     except Exception as e:
@@ -160,6 +224,12 @@ def run_server():
             # ȷԴر
             conn.close()
             s.close()
+            if recorder is not None:
+                recorder.close()
+            if vad is not None:
+                vad.close()
+            if identifier is not None:
+                identifier.close()
             print('[] ˳')
 
 
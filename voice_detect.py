@@ -3,45 +3,16 @@ import functools
 from mvector.predict import MVectorPredictor
 from mvector.utils.utils import add_arguments, print_arguments
 import numpy as np
-import random
 from pathlib import Path
-from typing import List
 
-# ===== 你可以在这里修改每组抽样多少个音频文件进行对比 =====
-num_samples = 10
+from voice_index import load_index
+from voice_match import top_k, get_subfolder_paths, stack_groups, score_groups
 
 def find_max_with_index(arr):
     max_val = max(arr)
     max_index = arr.index(max_val) + 1
     return max_val, max_index
 
-def get_subfolder_paths(root_dir: str) -> List[str]:
-    root_path = Path(root_dir).resolve()
-    subfolder_paths = []
-
-    for entry in root_path.iterdir():
-        if entry.is_dir():
-            subfolder_paths.append(str(entry.resolve()))
-
-    return sorted(subfolder_paths)
-
-def get_audio_files(directory: str) -> List[str]:
-    directory = Path(directory)
-    if not directory.exists():
-        raise ValueError(f"目录不存在: {directory}")
-    return [
-        str(file)
-        for file in directory.glob("*")
-        if file.suffix.lower() in ('.wav', '.mp3', '.flac')
-    ]
-
-def calculate_trimmed_mean(scores: List[float]) -> float:
-    if len(scores) <= 2:
-        return np.mean(scores) if scores else 0.0
-    sorted_scores = sorted(scores)
-    trimmed_scores = sorted_scores[1:-1]  # 去掉最大值和最小值
-    return np.mean(trimmed_scores) if trimmed_scores else 0.0
-
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="音频相似度组匹配")
     add_arg = functools.partial(add_arguments, argparser=parser)
@@ -50,6 +21,7 @@ if __name__ == '__main__':
     add_arg('audio_path1',      str,    'received_data/audio/Bseal.wav', '预测第一个音频')
     add_arg('threshold',        float,  0.6,                         '判断是否为同一个人的阈值')
     add_arg('model_path',       str,    'voice_dataset/best_model',  '导出的预测模型文件路径')
+    add_arg('top_k',            int,    top_k,                       '每组取最相似的前 k 个计算 top-k 得分')
     args = parser.parse_args()
     print_arguments(args=args)
 
@@ -65,30 +37,34 @@ if __name__ == '__main__':
     for idx, path in enumerate(subfolders):
         print(f"组 {idx+1}: {path}")
 
-    animal_voices = [get_audio_files(p) for p in subfolders]
+    # 参考音频的特征来自持久化索引，只有新增或改动的文件才会重新提取；待测音频只提取一次
+    index = load_index(predictor, args.configs, args.model_path)
+    names, group_files, group_features = index.groups()
+    by_name = {name: (files, feats) for name, files, feats in zip(names, group_files, group_features)}
+    # 按子目录顺序排列各组，没有可用音频的组为空
+    ordered = [by_name.get(Path(path).name, ([], None)) for path in subfolders]
     voice_dist = []
 
-    for i, files in enumerate(animal_voices):
-        if not files:
-            print(f"❗ 组 {i+1} 中没有音频文件，跳过")
-            voice_dist.append(0.0)
-            continue
-
-        sample_files = files if len(files) <= num_samples else random.sample(files, num_samples)
-        scores = []
-
-        print(f"\n▶ 组 {i+1} 预测文件：")
-        for file_path in sample_files:
-            try:
-                score = predictor.contrast(args.audio_path1, file_path)
-                scores.append(score)
-                print(f"   文件: {file_path} ，相似度: {score:.4f}")
-            except Exception as e:
-                print(f"❌ 对比失败: {file_path}，错误: {e}")
-
-        avg_score = calculate_trimmed_mean(scores)
-        voice_dist.append(avg_score)
-        print(f"✅ 组 {i+1} 随机抽样 {len(scores)} 个文件，去除最高/最低后平均相似度：{avg_score:.4f}")
+    if any(files for files, _ in ordered):
+        dim = next(feats.shape[1] for files, feats in ordered if files)
+        refs, bounds, centroids = stack_groups(
+            [feats if files else np.empty((0, dim), np.float32) for files, feats in ordered])
+        query = predictor.predict(args.audio_path1)
+        # 全部参考音频一次矩阵乘，结果与抽样无关、每次相同
+        sims, trimmed, centroid, top = score_groups(query, refs, bounds, centroids, args.top_k)
+
+        for i, (files, _) in enumerate(ordered):
+            if not files:
+                print(f"❗ 组 {i+1} 中没有音频文件，跳过")
+                voice_dist.append(0.0)
+                continue
+            group_sims = sims[bounds[i]:bounds[i + 1]]
+            print(f"\n▶ 组 {i+1} 最相似的文件：")
+            for j in np.argsort(group_sims)[::-1][:args.top_k]:
+                print(f"   文件: {files[j]} ，相似度: {group_sims[j]:.4f}")
+            voice_dist.append(float(trimmed[i]))
+            print(f"✅ 组 {i+1} 共 {len(files)} 个文件，去除最高/最低后平均相似度：{trimmed[i]:.4f}，"
+                  f"质心相似度：{centroid[i]:.4f}，top-{args.top_k} 平均：{top[i]:.4f}")
 
     if voice_dist:
         value, idx = find_max_with_index(voice_dist)
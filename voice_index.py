@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from voice_match import get_subfolder_paths, get_audio_files
+
+# 参考音频声纹特征的持久化索引，存成一个 <index_dir>/index.npz：
+#   embeddings   每个参考音频一行特征（float32）
+#   manifest     JSON（按 UTF-8 字节存成 uint8 数组）：每行对应的文件、所属组、大小、修改时间、sha1，
+#                以及生成特征的模型标识
+# 两部分在同一个文件里，一次 os.replace 整体替换，不会出现特征和清单来自不同版本的情况。
+# 重新加载时按大小 + 修改时间判断文件是否变化，变化了再比 sha1，只有内容真的变了才重新提取；
+# 删除的文件自动移除，模型或配置变了则全部重建。
+
+INDEX_DIR = 'voice_dataset/.embedding_index'
+INDEX_NAME = 'index.npz'
+
+
+def file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def model_key(configs: str, model_path: str) -> str:
+    """配置文件与模型目录下各文件的大小和修改时间，任一变化都会让索引失效"""
+    entries = []
+    for p in [configs] + sorted(str(f) for f in Path(model_path).rglob('*') if f.is_file()):
+        if os.path.exists(p):
+            st = os.stat(p)
+            entries.append(f"{p}:{st.st_size}:{st.st_mtime_ns}")
+    return hashlib.sha1('\n'.join(entries).encode('utf-8')).hexdigest()
+
+
+class EmbeddingIndex:
+    def __init__(self, root_dir: str, key: str, entries: List[Dict], embeddings: np.ndarray):
+        self.root_dir = root_dir
+        self.key = key
+        self.entries = entries
+        self.embeddings = embeddings
+
+    @classmethod
+    def load_or_build(cls, predictor, root_dir: str = 'voice_dataset/data', index_dir: str = INDEX_DIR,
+                      key: str = '') -> 'EmbeddingIndex':
+        """加载索引并增量更新：只为新增或内容变化的参考音频提取特征"""
+        old_entries, old_embeddings = cls._read(index_dir, key)
+        old_by_path = {e['path']: i for i, e in enumerate(old_entries)}
+
+        entries, rows = [], []
+        reused = embedded = 0
+        t0 = time.perf_counter()
+        for group_path in get_subfolder_paths(root_dir):
+            group = os.path.basename(group_path)
+            for file_path in sorted(get_audio_files(group_path)):
+                rel = os.path.relpath(file_path, root_dir)
+                st = os.stat(file_path)
+                entry = {'path': rel, 'group': group, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+                i = old_by_path.get(rel)
+                old = old_entries[i] if i is not None else None
+                if old is not None and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns:
+                    entry['sha1'] = old['sha1']
+                else:
+                    entry['sha1'] = file_sha1(file_path)
+                if old is not None and old['sha1'] == entry['sha1']:
+                    rows.append(old_embeddings[i])
+                    reused += 1
+                else:
+                    try:
+                        rows.append(np.asarray(predictor.predict(file_path), dtype=np.float32))
+                    except Exception as e:
+                        print(f"❌ 提取特征失败: {file_path}，错误: {e}")
+                        continue
+                    embedded += 1
+                entries.append(entry)
+
+        embeddings = np.stack(rows) if rows else np.empty((0, 0), dtype=np.float32)
+        index = cls(root_dir, key, entries, embeddings)
+        if entries != old_entries:
+            index.save(index_dir)
+        current = {e['path'] for e in entries}
+        removed = sum(1 for e in old_entries if e['path'] not in current)
+        print(f"声纹索引: {len(entries)} 个参考音频，复用 {reused}，新提取 {embedded}，移除 {removed}，"
+              f"用时 {time.perf_counter() - t0:.2f} s")
+        return index
+
+    @staticmethod
+    def _read(index_dir: str, key: str) -> Tuple[List[Dict], np.ndarray]:
+        try:
+            with np.load(os.path.join(index_dir, INDEX_NAME), allow_pickle=False) as data:
+                manifest = json.loads(data['manifest'].tobytes().decode('utf-8'))
+                embeddings = data['embeddings']
+        except (OSError, ValueError, KeyError):
+            return [], np.empty((0, 0), dtype=np.float32)
+        if manifest.get('key') != key or len(manifest.get('files', [])) != len(embeddings):
+            print("声纹索引与当前模型不一致，重新生成")
+            return [], np.empty((0, 0), dtype=np.float32)
+        return manifest['files'], embeddings
+
+    def save(self, index_dir: str = INDEX_DIR):
+        os.makedirs(index_dir, exist_ok=True)
+        manifest = json.dumps({'key': self.key, 'files': self.entries}, ensure_ascii=False).encode('utf-8')
+        # 特征和清单写进同一个临时文件再一次替换：中途退出只会留下旧索引；
+        # 临时文件名唯一，服务和 voice_detect.py 同时重建时互不覆盖，最后替换的一方生效
+        fd, tmp_path = tempfile.mkstemp(dir=index_dir, prefix=INDEX_NAME, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, embeddings=self.embeddings, manifest=np.frombuffer(manifest, dtype=np.uint8))
+            os.replace(tmp_path, os.path.join(index_dir, INDEX_NAME))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def groups(self) -> Tuple[List[str], List[List[str]], List[np.ndarray]]:
+        """按组返回 (组名列表, 每组文件路径列表, 每组特征矩阵列表)，组按名称排序"""
+        order: Dict[str, List[int]] = {}
+        for i, e in enumerate(self.entries):
+            order.setdefault(e['group'], []).append(i)
+        names = sorted(order)
+        paths = [[os.path.join(self.root_dir, self.entries[i]['path']) for i in order[n]] for n in names]
+        feats = [self.embeddings[order[n]] for n in names]
+        return names, paths, feats
+
+
+def load_index(predictor, configs: str, model_path: str, root_dir: str = 'voice_dataset/data',
+               index_dir: str = INDEX_DIR) -> EmbeddingIndex:
+    return EmbeddingIndex.load_or_build(predictor, root_dir, index_dir, model_key(configs, model_path))
@@ -0,0 +1,84 @@
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+# 参考音频目录扫描与相似度打分，voice_detect / voice_index / voice_stream_detect / voice_service 共用。
+# 只依赖 numpy，导入时没有副作用。
+
+# ===== 每组取相似度最高的多少个参考音频计算 top-k 得分 =====
+top_k = 3
+
+def get_subfolder_paths(root_dir: str) -> List[str]:
+    root_path = Path(root_dir).resolve()
+    subfolder_paths = []
+
+    for entry in root_path.iterdir():
+        if entry.is_dir():
+            subfolder_paths.append(str(entry.resolve()))
+
+    return sorted(subfolder_paths)
+
+def get_audio_files(directory: str) -> List[str]:
+    directory = Path(directory)
+    if not directory.exists():
+        raise ValueError(f"目录不存在: {directory}")
+    return [
+        str(file)
+        for file in directory.glob("*")
+        if file.suffix.lower() in ('.wav', '.mp3', '.flac')
+    ]
+
+def calculate_trimmed_mean(scores: List[float]) -> float:
+    if len(scores) <= 2:
+        return np.mean(scores) if scores else 0.0
+    sorted_scores = sorted(scores)
+    trimmed_scores = sorted_scores[1:-1]  # 去掉最大值和最小值
+    return np.mean(trimmed_scores) if trimmed_scores else 0.0
+
+def stack_groups(group_features: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """把各组特征拼成一个单位化矩阵，返回 (参考矩阵 N×D, 组边界 G+1, 组质心 G×D)"""
+    dim = next((f.shape[1] for f in group_features if len(f)), 0)
+    refs = np.concatenate([f.reshape(-1, dim) for f in group_features]).astype(np.float32)
+    refs /= np.linalg.norm(refs, axis=1, keepdims=True) + 1e-12
+    bounds = np.cumsum([0] + [len(f) for f in group_features])
+    centroids = np.zeros((len(group_features), dim), dtype=np.float32)
+    for i in range(len(group_features)):
+        if bounds[i + 1] > bounds[i]:
+            centroids[i] = refs[bounds[i]:bounds[i + 1]].mean(axis=0)
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+    return refs, bounds, centroids
+
+def score_groups(query: np.ndarray, refs: np.ndarray, bounds: np.ndarray, centroids: np.ndarray, k: int = top_k):
+    """一次矩阵乘得到待测音频与全部参考音频的余弦相似度，再按组求
+    去极值平均（与 calculate_trimmed_mean 相同）、质心相似度和 top-k 平均。
+    返回 (相似度 N, 去极值平均 G, 质心 G, top-k G)，空组得分为 0"""
+    query = query / (np.linalg.norm(query) + 1e-12)
+    sims = refs @ query
+    sizes = np.diff(bounds)
+    groups = len(sizes)
+    width = max(int(sizes.max()) if groups else 0, 1)
+
+    # 各组相似度排进 G×width 的矩阵，不足处填 -inf；升序排序后有效值都在每行末尾，
+    # 于是去极值和、top-k 和都是前缀和上的一次区间相减
+    padded = np.full((groups, width), -np.inf)
+    rows = np.repeat(np.arange(groups), sizes)
+    cols = np.arange(len(sims)) - np.repeat(bounds[:-1], sizes)
+    padded[rows, cols] = sims
+    padded.sort(axis=1)
+    padded[np.isinf(padded)] = 0.0
+    csum = np.concatenate([np.zeros((groups, 1)), np.cumsum(padded, axis=1)], axis=1)
+
+    def prefix(col):
+        return np.take_along_axis(csum, col[:, None], axis=1)[:, 0]
+
+    total = csum[:, width]
+    first = width - sizes  # 每组最小值所在列
+    inner = csum[:, width - 1] - prefix(np.minimum(first + 1, width))  # 去掉最小和最大
+    trimmed = np.where(sizes > 2, inner / np.maximum(sizes - 2, 1), total / np.maximum(sizes, 1))
+    kk = np.minimum(sizes, k)
+    top = (total - prefix(width - kk)) / np.maximum(kk, 1)
+    centroid = centroids @ query
+    empty = sizes == 0
+    trimmed[empty] = top[empty] = centroid[empty] = 0.0
+    return sims, trimmed, centroid, top
@@ -0,0 +1,331 @@
+import argparse
+import functools
+import getpass
+import os
+import secrets
+import stat
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from voice_index import load_index
+from voice_match import get_audio_files, get_subfolder_paths, score_groups, stack_groups
+
+# 常驻声纹检测服务：模型和参考音频索引只加载一次，之后每个请求只做一次前向 + 一次矩阵乘。
+# 请求走本机连接（Windows 命名管道，其他系统 Unix socket），内容是 dict：
+#   {'cmd': 'detect', 'audio_path': ...}  -> {'ok': True, 'result': {...}} 或 {'ok': False, 'error': ...}
+#   {'cmd': 'ping'}                       -> {'ok': True, 'loading': 是否还在加载模型或重建索引}
+# run.py 启动时拉起本服务，检测时通过 detect_remote() 提交；连不上服务时再退回单独运行 voice_detect.py。
+# mvector 只在服务端导入，run.py 引用客户端函数时不会加载模型相关的库。
+#
+# multiprocessing.connection 收发的是 pickle，所以地址放在只有当前用户能进的目录里，
+# 并且双方用随机密钥互相认证后才收发数据：run.py 每次启动生成密钥，经环境变量
+# VOICE_SERVICE_AUTHKEY 交给它拉起的服务；单独启动服务时密钥写到该目录下的 authkey 文件（0600）。
+#
+#   python voice_service.py                         启动服务
+#   python voice_service.py --audio_path x.wav      把文件交给已运行的服务检测
+
+AUTHKEY_ENV = 'VOICE_SERVICE_AUTHKEY'
+AUTHKEY_FILE = 'authkey'
+DETECT_TIMEOUT = 60.0  # 等待检测结果的上限（秒），服务加载模型、重建索引的时间不计在内
+STATUS_INTERVAL = 2.0  # 等待结果期间每隔多久另开连接 ping 一次，确认服务是否还在加载
+
+
+def runtime_dir() -> str:
+    """当前用户专用的目录：优先 XDG_RUNTIME_DIR，否则在临时目录下建一个 0700 的子目录"""
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if base and os.path.isdir(base):
+        path = os.path.join(base, 'voice_detect')
+    else:
+        path = os.path.join(tempfile.gettempdir(), f'voice_detect-{getpass.getuser()}')
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if sys.platform != 'win32':
+        # 目录可能是别人抢先建好的：必须是自己的、不是链接、别人不可访问
+        st = os.lstat(path)
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+            raise PermissionError(f"{path} 不属于当前用户或权限过宽")
+    return path
+
+
+def default_address() -> str:
+    if sys.platform == 'win32':
+        return rf'\\.\pipe\voice_detect-{getpass.getuser()}'
+    return os.path.join(runtime_dir(), 'service.sock')
+
+
+def load_authkey(create: bool = False) -> bytes:
+    """优先取环境变量中的密钥；否则读 authkey 文件，create=True 时重新生成并写入"""
+    key = os.environ.get(AUTHKEY_ENV)
+    if key:
+        return key.encode()
+    path = os.path.join(runtime_dir(), AUTHKEY_FILE)
+    if create:
+        key = secrets.token_hex(32)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(key)
+        return key.encode()
+    with open(path, 'r') as f:
+        return f.read().strip().encode()
+
+
+class VoiceDetector:
+    """持有模型和参考特征矩阵；参考音频有增删改时按索引增量刷新
+
+    构造时不加载模型：load() 在主线程里加载，期间到来的 detect() 等待加载完成。
+    """
+
+    def __init__(self, configs: str, model_path: str, use_gpu: bool, threshold: float, top_k: int,
+                 root_dir: str = 'voice_dataset/data'):
+        self.configs = configs
+        self.model_path = model_path
+        self.use_gpu = use_gpu
+        self.threshold = threshold
+        self.top_k = top_k
+        self.root_dir = root_dir
+        self.predictor = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._refreshing = False
+        self._signature = None
+
+    def load(self):
+        from mvector.predict import MVectorPredictor
+
+        with self._lock:
+            self.predictor = MVectorPredictor(configs=self.configs, model_path=self.model_path,
+                                              use_gpu=self.use_gpu)
+            self.refresh()
+            self.warmup()
+        self._ready.set()
+
+    def loading(self) -> bool:
+        """模型还没加载完，或正在为变化的参考音频重建索引"""
+        return not self._ready.is_set() or self._refreshing
+
+    def _data_signature(self):
+        entries = []
+        for group_path in get_subfolder_paths(self.root_dir):
+            for file_path in get_audio_files(group_path):
+                st = os.stat(file_path)
+                entries.append((file_path, st.st_size, st.st_mtime_ns))
+        return sorted(entries)
+
+    def refresh(self):
+        """参考音频目录有变化时重新加载索引（只为变化的文件提取特征）"""
+        signature = self._data_signature()
+        if signature == self._signature:
+            return
+        self._refreshing = True
+        try:
+            index = load_index(self.predictor, self.configs, self.model_path, self.root_dir)
+        finally:
+            self._refreshing = False
+        names, group_files, group_features = index.groups()
+        by_name = {name: (files, feats) for name, files, feats in zip(names, group_files, group_features)}
+        self.group_names = [os.path.basename(p) for p in get_subfolder_paths(self.root_dir)]
+        ordered = [by_name.get(name, ([], None)) for name in self.group_names]
+        self.group_files = [files for files, _ in ordered]
+        if any(self.group_files):
+            dim = next(feats.shape[1] for files, feats in ordered if files)
+            self.refs, self.bounds, self.centroids = stack_groups(
+                [feats if files else np.empty((0, dim), np.float32) for files, feats in ordered])
+        else:
+            self.refs = None
+        self._signature = signature
+
+    def warmup(self):
+        """先跑一次前向，避免第一个请求承担推理框架的初始化开销"""
+        for files in self.group_files:
+            if files:
+                t0 = time.perf_counter()
+                self.predictor.predict(files[0])
+                print(f"[服务端] 预热完成，用时 {time.perf_counter() - t0:.2f} s")
+                return
+
+    def detect(self, audio_path: str) -> dict:
+        self._ready.wait()
+        t0 = time.perf_counter()
+        with self._lock:
+            self.refresh()
+            if self.refs is None:
+                raise ValueError("没有可用的参考音频")
+            query = self.predictor.predict(audio_path)
+            sims, trimmed, centroid, top = score_groups(query, self.refs, self.bounds, self.centroids, self.top_k)
+
+            groups = []
+            for i, (name, files) in enumerate(zip(self.group_names, self.group_files)):
+                group_sims = sims[self.bounds[i]:self.bounds[i + 1]]
+                best_files = [(files[j], float(group_sims[j])) for j in np.argsort(group_sims)[::-1][:self.top_k]]
+                groups.append({'name': name, 'count': len(files), 'trimmed': float(trimmed[i]),
+                               'centroid': float(centroid[i]), 'top': float(top[i]), 'files': best_files})
+        best = max(range(len(groups)), key=lambda i: groups[i]['trimmed'])
+        score = groups[best]['trimmed']
+        return {'audio_path': audio_path, 'groups': groups, 'best': groups[best]['name'], 'score': score,
+                'matched': score > self.threshold, 'top_k': self.top_k,
+                'elapsed': time.perf_counter() - t0}
+
+
+def format_result(result: dict) -> str:
+    """把检测结果排成与 voice_detect.py 相同的文字"""
+    lines = []
+    for i, g in enumerate(result['groups']):
+        if not g['count']:
+            lines.append(f"❗ 组 {i+1} ({g['name']}) 中没有音频文件，跳过")
+            continue
+        lines.append(f"▶ 组 {i+1} ({g['name']}) 最相似的文件：")
+        for path, sim in g['files']:
+            lines.append(f"   文件: {path} ，相似度: {sim:.4f}")
+        lines.append(f"✅ 共 {g['count']} 个文件，去除最高/最低后平均相似度：{g['trimmed']:.4f}，"
+                     f"质心相似度：{g['centroid']:.4f}，top-{result['top_k']} 平均：{g['top']:.4f}")
+    if result['matched']:
+        lines.append(f"✅ 匹配成功，最相似的是动物: {result['best']}，相似度为：{result['score']:.4f}")
+    else:
+        lines.append(f"⚠️ 无法确认是否匹配，仅最相似的动物是: {result['best']}，相似度为：{result['score']:.4f}")
+    lines.append(f"检测用时 {result['elapsed'] * 1000:.0f} ms")
+    return '\n'.join(lines)
+
+
+def handle_client(conn, detector: VoiceDetector):
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return
+            cmd = request.get('cmd') if isinstance(request, dict) else None
+            try:
+                if cmd == 'ping':
+                    # 不取检测锁，加载或检测进行中也能立即应答
+                    reply = {'ok': True, 'loading': detector.loading()}
+                elif cmd == 'detect':
+                    result = detector.detect(request['audio_path'])
+                    print(f"[服务端] {result['audio_path']} -> {result['best']} {result['score']:.4f}，"
+                          f"用时 {result['elapsed'] * 1000:.0f} ms")
+                    reply = {'ok': True, 'result': result}
+                else:
+                    reply = {'ok': False, 'error': f"未知命令: {cmd}"}
+            except Exception as e:
+                print(f"[服务端] 请求处理失败: {e}")
+                reply = {'ok': False, 'error': str(e)}
+            try:
+                conn.send(reply)
+            except OSError:
+                return
+
+
+def open_listener(address: str, authkey: bytes) -> Listener:
+    """Unix socket 文件可能是上次异常退出留下的：连不上就删掉重建"""
+    if sys.platform != 'win32' and os.path.exists(address):
+        try:
+            Client(address, authkey=authkey).close()
+        except ConnectionRefusedError:
+            os.unlink(address)
+        except AuthenticationError:
+            raise RuntimeError(f"检测服务已在运行（密钥不同）: {address}")
+        else:
+            raise RuntimeError(f"检测服务已在运行: {address}")
+    return Listener(address, authkey=authkey)
+
+
+def accept_loop(listener: Listener, detector: VoiceDetector, stop: threading.Event):
+    while True:
+        try:
+            conn = listener.accept()
+        except (OSError, AuthenticationError) as e:
+            if stop.is_set():
+                return
+            # 认证失败等单个连接的错误不影响服务
+            print(f"[服务端] 接受连接失败: {e}")
+            continue
+        threading.Thread(target=handle_client, args=(conn, detector), daemon=True).start()
+
+
+def serve(detector_args: dict, address: str = '', authkey: bytes = None):
+    address = address or default_address()
+    listener = open_listener(address, authkey or load_authkey(create=True))
+    # 先开始接受连接再加载模型：加载期间的请求完成认证后等待模型就绪，而不是被当成服务不可用
+    detector = VoiceDetector(**detector_args)
+    stop = threading.Event()
+    threading.Thread(target=accept_loop, args=(listener, detector, stop), daemon=True).start()
+    print(f"[服务端] 监听 {address}，加载模型...")
+    try:
+        t0 = time.perf_counter()
+        detector.load()
+        print(f"[服务端] 就绪，启动用时 {time.perf_counter() - t0:.2f} s")
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        listener.close()
+
+
+def service_status(address: str = '', authkey: bytes = None, timeout: float = DETECT_TIMEOUT) -> dict:
+    """ping 服务，返回 {'ok': True, 'loading': ...}"""
+    with Client(address or default_address(), authkey=authkey or load_authkey()) as conn:
+        conn.send({'cmd': 'ping'})
+        if not conn.poll(timeout):
+            raise TimeoutError(f"检测服务 {timeout:.0f} 秒内没有应答")
+        return conn.recv()
+
+
+def detect_remote(audio_path: str, address: str = '', authkey: bytes = None,
+                  timeout: float = DETECT_TIMEOUT, on_loading=None) -> dict:
+    """把文件交给常驻服务检测并等待结果
+
+    等待期间定时另开连接 ping 服务：还在加载模型或重建索引时继续等，不计入 timeout，
+    并在进入加载状态时调用一次 on_loading()。
+    服务未运行时抛出 OSError，服务在线但 timeout 内没有结果时抛出 TimeoutError（OSError 的子类），
+    等待中服务退出时抛出 EOFError，密钥不符时抛出 AuthenticationError。
+    """
+    address = address or default_address()
+    authkey = authkey or load_authkey()
+    with Client(address, authkey=authkey) as conn:
+        conn.send({'cmd': 'detect', 'audio_path': os.path.abspath(audio_path)})
+        waited = 0.0
+        loading = False
+        while not conn.poll(STATUS_INTERVAL):
+            if service_status(address, authkey, timeout)['loading']:
+                if not loading and on_loading is not None:
+                    on_loading()
+                loading = True
+                waited = 0.0
+                continue
+            loading = False
+            waited += STATUS_INTERVAL
+            if waited >= timeout:
+                raise TimeoutError(f"检测服务 {timeout:.0f} 秒内没有应答")
+        reply = conn.recv()
+    if not reply['ok']:
+        raise RuntimeError(reply['error'])
+    return reply['result']
+
+
+if __name__ == '__main__':
+    from mvector.utils.utils import add_arguments, print_arguments
+
+    parser = argparse.ArgumentParser(description="常驻声纹检测服务")
+    add_arg = functools.partial(add_arguments, argparser=parser)
+    add_arg('configs',          str,    'voice_dataset/cam++.yml',   '配置文件')
+    add_arg('use_gpu',          bool,   True,                        '是否使用GPU预测')
+    add_arg('threshold',        float,  0.6,                         '判断为同一种动物的阈值')
+    add_arg('model_path',       str,    'voice_dataset/best_model',  '导出的预测模型文件路径')
+    add_arg('top_k',            int,    3,                           '每组取最相似的前 k 个计算 top-k 得分')
+    add_arg('address',          str,    '',                          '服务地址（命名管道或 Unix socket），默认在当前用户目录下')
+    add_arg('audio_path',       str,    '',                          '不为空时作为客户端提交该文件检测')
+    args = parser.parse_args()
+
+    if args.audio_path:
+        print(format_result(detect_remote(args.audio_path, args.address,
+                                          on_loading=lambda: print("检测服务正在加载模型，等待..."))))
+    else:
+        print_arguments(args=args)
+        serve({'configs': args.configs, 'model_path': args.model_path, 'use_gpu': args.use_gpu,
+               'threshold': args.threshold, 'top_k': args.top_k}, args.address)
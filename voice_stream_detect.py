@@ -0,0 +1,199 @@
+import argparse
+import collections
+import functools
+import queue
+import threading
+import time
+import wave
+from typing import List
+
+import numpy as np
+from mvector.predict import MVectorPredictor
+from mvector.utils.utils import add_arguments, print_arguments
+
+from voice_match import stack_groups, score_groups
+from voice_index import load_index
+
+# 实时识别：模型常驻，对直播音频的重叠窗口逐个提取声纹，与 voice_dataset/data 各组比对。
+# 参考音频的特征来自 voice_index 的持久化索引；每个窗口只做一次前向，再与所有参考特征做一次矩阵乘。
+# 可单独运行（用 wav 文件模拟直播流），也可由 tcp_receive_voice.py 设置 IDENTIFY_ENABLED 调用。
+
+
+def normalize_rows(x: np.ndarray) -> np.ndarray:
+    return x / (np.linalg.norm(x, axis=-1, keepdims=True) + 1e-12)
+
+
+def load_reference_groups(predictor, configs: str, model_path: str, root_dir: str = 'voice_dataset/data'):
+    """从持久化索引取每组全部参考音频的声纹特征，返回 (组名列表, 每组的单位化特征矩阵列表)"""
+    index = load_index(predictor, configs, model_path, root_dir)
+    names, _, features = index.groups()
+    for name, feats in zip(names, features):
+        print(f"组 {name}: {len(feats)} 个参考音频")
+    return names, [normalize_rows(f) for f in features]
+
+
+class StreamIdentifier:
+    """对实时音频做滑动窗口识别
+
+    submit() 在网络线程中调用，只把包放进队列；识别线程维护最近 window 秒的采样，
+    每攒够 hop 秒新数据识别一次。识别跟不上时先取完队列再识别，只处理最新的窗口，
+    跳过的窗口计入 skipped，因此延迟不会累积。
+
+    每组得分 = 窗口与该组各参考音频余弦相似度的去极值平均（与 voice_detect.py 相同的 score_groups）；
+    滚动置信度是各组得分的指数平均，smoothing 越大越跟手。
+    """
+
+    def __init__(self, predictor, names: List[str], groups: List[np.ndarray], rate: int,
+                 window: float = 2.0, hop: float = 0.5, smoothing: float = 0.3,
+                 threshold: float = 0.6, min_rms: float = 0.005, on_result=None):
+        self.predictor = predictor
+        self.names = names
+        self.groups = groups
+        self.rate = rate
+        self.window = int(window * rate)
+        self.hop = int(hop * rate)
+        self.smoothing = smoothing
+        self.threshold = threshold
+        self.min_rms = min_rms
+        self.on_result = on_result or self.print_result
+
+        # 所有参考特征拼成一个矩阵，每个窗口只做一次矩阵乘
+        self._refs, self._bounds, self._centroids = stack_groups(groups)
+
+        self.rolling = np.zeros(len(names), dtype=np.float32)
+        self.latest = None
+        self.windows = 0
+        self.skipped = 0
+        self.latencies = collections.deque(maxlen=200)
+        self._buf = np.zeros(self.window, dtype=np.float32)
+        self._filled = 0
+        self._since_hop = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='stream-identify', daemon=True)
+        self._thread.start()
+
+    def submit(self, pcm: np.ndarray):
+        self._queue.put(pcm)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _push(self, pcm: np.ndarray):
+        n = len(pcm)
+        if n >= self.window:
+            self._buf[:] = pcm[-self.window:]
+        else:
+            self._buf[:-n] = self._buf[n:]
+            self._buf[-n:] = pcm
+        self._filled = min(self._filled + n, self.window)
+        self._since_hop += n
+
+    def _run(self):
+        while True:
+            pcm = self._queue.get()
+            if pcm is None:
+                return
+            self._push(pcm)
+            if self._filled < self.window or self._since_hop < self.hop:
+                continue
+            # 识别跟不上时把积压的包全部并入窗口，只识别最新的一个窗口
+            while True:
+                try:
+                    pcm = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if pcm is None:
+                    return
+                self._push(pcm)
+            hops = self._since_hop // self.hop
+            self.skipped += hops - 1
+            self._since_hop -= hops * self.hop
+            self._identify()
+
+    def _identify(self):
+        window = self._buf.copy()
+        if np.sqrt(np.mean(window * window)) < self.min_rms:
+            return
+        t0 = time.perf_counter()
+        try:
+            feature = self.predictor.predict(window, sample_rate=self.rate)
+        except Exception as e:
+            print(f"❌ 窗口识别失败: {e}")
+            return
+        _, scores, _, _ = score_groups(np.asarray(feature, dtype=np.float32),
+                                       self._refs, self._bounds, self._centroids)
+        latency = time.perf_counter() - t0
+        self.latencies.append(latency)
+        self.windows += 1
+
+        if self.windows == 1:
+            self.rolling[:] = scores
+        else:
+            self.rolling += (scores - self.rolling) * self.smoothing
+        best = int(np.argmax(self.rolling))
+        self.latest = (self.names[best], float(scores[best]), float(self.rolling[best]), latency)
+        self.on_result(*self.latest)
+
+    def print_result(self, name: str, score: float, confidence: float, latency: float):
+        mark = '✅' if confidence > self.threshold else '…'
+        print(f"{mark} 最像: {name}  本窗 {score:.3f}  滚动置信度 {confidence:.3f}  耗时 {latency * 1000:.0f} ms")
+
+    def report(self) -> str:
+        if not self.latencies:
+            return f"识别 {self.windows} 窗"
+        p50, p95 = np.percentile(list(self.latencies), [50, 95]) * 1000
+        hop_ms = self.hop / self.rate * 1000
+        return (f"识别 {self.windows} 窗，跳过 {self.skipped} 窗，"
+                f"单窗耗时 p50 {p50:.0f} ms p95 {p95:.0f} ms（步长 {hop_ms:.0f} ms）")
+
+
+def create_identifier(rate: int, configs: str = 'voice_dataset/cam++.yml',
+                      model_path: str = 'voice_dataset/best_model', root_dir: str = 'voice_dataset/data',
+                      use_gpu: bool = False, **kwargs) -> StreamIdentifier:
+    """加载模型与参考特征，返回已启动的 StreamIdentifier"""
+    predictor = MVectorPredictor(configs=configs, model_path=model_path, use_gpu=use_gpu)
+    names, groups = load_reference_groups(predictor, configs, model_path, root_dir)
+    if not names:
+        raise ValueError(f"{root_dir} 下没有可用的参考音频")
+    return StreamIdentifier(predictor, names, groups, rate, **kwargs)
+
+
+def read_wav(path: str):
+    with wave.open(path, 'rb') as w:
+        if w.getsampwidth() != 2:
+            raise ValueError("只支持 16 位 wav")
+        data = np.frombuffer(w.readframes(w.getnframes()), np.int16)
+        data = data.reshape(-1, w.getnchannels())[:, 0]
+        return w.getframerate(), data.astype(np.float32) / 32768.0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="实时滑动窗口声纹识别（用 wav 文件模拟直播流）")
+    add_arg = functools.partial(add_arguments, argparser=parser)
+    add_arg('configs',          str,    'voice_dataset/cam++.yml',   '配置文件')
+    add_arg('use_gpu',          bool,   False,                       '是否使用GPU预测')
+    add_arg('model_path',       str,    'voice_dataset/best_model',  '导出的预测模型文件路径')
+    add_arg('audio_path',       str,    'received_data/audio/Bseal.wav', '模拟直播流的音频')
+    add_arg('window',           float,  2.0,                         '窗口长度（秒）')
+    add_arg('hop',              float,  0.5,                         '窗口步长（秒）')
+    add_arg('smoothing',        float,  0.3,                         '滚动置信度的平滑系数')
+    add_arg('threshold',        float,  0.6,                         '判断为同一种动物的阈值')
+    add_arg('realtime',         bool,   True,                        '按实际时长送入音频')
+    args = parser.parse_args()
+    print_arguments(args=args)
+
+    rate, pcm = read_wav(args.audio_path)
+    identifier = create_identifier(rate, args.configs, args.model_path, use_gpu=args.use_gpu,
+                                   window=args.window, hop=args.hop, smoothing=args.smoothing,
+                                   threshold=args.threshold)
+    block = 1024
+    start = time.perf_counter()
+    for i in range(0, len(pcm), block):
+        identifier.submit(pcm[i:i + block])
+        if args.realtime:
+            delay = (i + block) / rate - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+    identifier.close()
+    print(identifier.report())